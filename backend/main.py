@@ -1,39 +1,111 @@
-from flask import Flask, jsonify, send_from_directory
+from flask import Flask, Response, jsonify, request, send_from_directory
 from flask_cors import CORS
 from src import db, state, proxy_manager, browser_manager
 from src.api import api_bp, register_requests_blueprint, register_resender_blueprint
 import os
 import atexit
+import gzip
+import hashlib
+import mimetypes
 import signal
 import sys
 from pathlib import Path
 
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import waitress
+except ImportError:
+    waitress = None
+
+# Frontend files that are read into memory and precompressed at startup
+COMPRESSIBLE_SUFFIXES = frozenset({'.html', '.js', '.css', '.svg', '.json', '.txt', '.map'})
+# Vite emits content-hashed filenames under assets/, so they never change
+HASHED_ASSET_PREFIX = 'assets/'
+
+
+def build_asset_cache(frontend_dist):
+    """Read and precompress the frontend's text assets once"""
+    cache = {}
+    for file_path in frontend_dist.rglob('*'):
+        if not file_path.is_file() or file_path.suffix not in COMPRESSIBLE_SUFFIXES:
+            continue
+        data = file_path.read_bytes()
+        url_path = file_path.relative_to(frontend_dist).as_posix()
+        encodings = {'identity': data, 'gzip': gzip.compress(data, 9)}
+        if brotli is not None:
+            encodings['br'] = brotli.compress(data, quality=11)
+        if url_path.startswith(HASHED_ASSET_PREFIX):
+            cache_control = 'public, max-age=31536000, immutable'
+        else:
+            cache_control = 'no-cache'
+        cache[url_path] = {
+            'mimetype': mimetypes.guess_type(url_path)[0] or 'application/octet-stream',
+            'etag': hashlib.sha1(data).hexdigest(),
+            'encodings': encodings,
+            'cache_control': cache_control
+        }
+    return cache
+
+
+def serve_cached_asset(asset):
+    """Respond with a cached asset in the best encoding the client accepts"""
+    encoding = 'identity'
+    for candidate in ('br', 'gzip'):
+        if candidate in asset['encodings'] and request.accept_encodings[candidate]:
+            encoding = candidate
+            break
+    response = Response(asset['encodings'][encoding], mimetype=asset['mimetype'])
+    response.headers['Cache-Control'] = asset['cache_control']
+    response.headers['Vary'] = 'Accept-Encoding'
+    if encoding != 'identity':
+        response.headers['Content-Encoding'] = encoding
+        response.set_etag(f"{asset['etag']}-{encoding}")
+    else:
+        response.set_etag(asset['etag'])
+    return response.make_conditional(request)
+
 
 def create_app():
     """Create and configure the Flask application"""
     app = Flask(__name__)
     
+    # API responses include large lists (captured requests, resender versions), so
+    # don't sort every dict's keys and always emit compact JSON
+    app.json.sort_keys = False
+    app.json.compact = True
+    
+    # Behind Apache (mod_xsendfile) or lighttpd, let the web server send file downloads
+    app.config['USE_X_SENDFILE'] = os.environ.get('USE_X_SENDFILE', 'false').lower() in ('true', '1', 'yes')
+    
     # Enable CORS for frontend connection
     # In Docker/production, allow all origins for flexibility
     cors_origins = os.environ.get('CORS_ORIGINS', 'http://localhost:5173,http://localhost:5174,http://localhost:8080').split(',')
+    # Preflight responses are cached by the browser for a day (max_age)
     CORS(app, resources={
         r"/api/*": {
             "origins": cors_origins,
             "methods": ["GET", "POST", "PUT", "DELETE"],
-            "allow_headers": ["Content-Type"]
+            "allow_headers": ["Content-Type"],
+            "max_age": 86400
         },
         r"/health": {
             "origins": cors_origins,
             "methods": ["GET"],
-            "allow_headers": ["Content-Type"]
+            "allow_headers": ["Content-Type"],
+            "max_age": 86400
         }
-    })
+    }, supports_credentials=False)
     
     # Initialize database
     db.init_db()
     
     # Ensure there's a default project
     default_project = db.ensure_default_project()
+    db.ensure_project_indexes()
     
     # Set it as current if no current project
     if state.get_current_project() is None:
@@ -54,16 +126,25 @@ def create_app():
     if not frontend_dist.exists():
         frontend_dist = app_dir.parent / 'frontend' / 'dist'
     if frontend_dist.exists():
+        asset_cache = build_asset_cache(frontend_dist)
+        # Every file in the build, so lookups never touch the disk or escape frontend_dist
+        asset_paths = frozenset(
+            p.relative_to(frontend_dist).as_posix() for p in frontend_dist.rglob('*') if p.is_file()
+        )
+        
         @app.route('/', defaults={'path': ''})
         @app.route('/<path:path>')
         def serve_frontend(path):
             """Serve frontend static files (only for non-API routes)"""
-            # Serve static files (JS, CSS, images, etc.) if they exist
-            if path:
-                static_file = frontend_dist / path
-                if static_file.exists() and static_file.is_file():
-                    return send_from_directory(str(frontend_dist), path)
+            # Text assets (JS, CSS, HTML, ...) are served precompressed from memory
+            if path in asset_cache:
+                return serve_cached_asset(asset_cache[path])
+            # Serve other static files (images, fonts, etc.) if they exist
+            if path in asset_paths:
+                return send_from_directory(str(frontend_dist), path)
             # Serve index.html for all other routes (SPA routing)
+            if 'index.html' in asset_cache:
+                return serve_cached_asset(asset_cache['index.html'])
             return send_from_directory(str(frontend_dist), 'index.html')
     
     # Health check route
@@ -89,6 +170,22 @@ def signal_handler(sig, frame):
     sys.exit(0)
 
 
+# Threads serving API requests under waitress (agent chats hold one for their whole turn)
+SERVER_THREADS = 16
+
+
+def run_server(app, port):
+    """Serve the app in this process, with waitress if it is installed"""
+    # The proxy subprocess, current project and browser sessions are owned by this
+    # process, so the app is served with threads rather than multiple workers
+    # The Werkzeug debugger is opt-in via FLASK_DEBUG=1
+    debug = os.environ.get('FLASK_DEBUG', '0') == '1'
+    if waitress is not None and not debug:
+        waitress.serve(app, host='0.0.0.0', port=port, threads=SERVER_THREADS)
+        return
+    app.run(host='0.0.0.0', port=port, debug=debug, use_reloader=False, threaded=True)
+
+
 def main():
     """Run the Flask application"""
     # Register cleanup handlers
@@ -115,7 +212,7 @@ def main():
     print(f"🔗 CORS enabled for frontend at http://localhost:5173")
     print(f"📡 Proxy API available at /api/proxy")
     print(f"🌍 Proxy available at http://localhost:{proxy_manager.get_proxy_port()}")
-    app.run(host='0.0.0.0', port=port, debug=True, use_reloader=False)
+    run_server(app, port)
 
 
 if __name__ == "__main__":
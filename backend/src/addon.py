@@ -3,9 +3,11 @@ Mitmproxy addon to capture HTTP requests and responses and store them in the pro
 """
 
 from mitmproxy.net.http.http1.assemble import assemble_request, assemble_response
-import json
 import logging
 import os
+import queue
+import select
+import socket
 import sys
 import threading
 import time
@@ -28,26 +30,173 @@ db.MAIN_DATABASE_PATH = str(backend_dir / 'projects_data' / 'moxy.db')
 
 logger = logging.getLogger(__name__)
 
+# Batched writes: flush every FLUSH_INTERVAL seconds or once FLUSH_BATCH_SIZE rows are queued
+FLUSH_INTERVAL = 0.02
+FLUSH_BATCH_SIZE = 128
+# Retries (with exponential backoff) when a batch finds the database locked
+WRITE_ATTEMPTS = 3
+WRITE_RETRY_DELAY = 0.05
+# Safety net in case a notification datagram is lost
+NOTIFY_FALLBACK_TIMEOUT = 5.0
+# Used only when the notify socket could not be opened
+POLL_INTERVAL = 0.1
+
+CREATE_REQUESTS_SQL = '''
+    CREATE TABLE IF NOT EXISTS requests (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        method TEXT NOT NULL,
+        url TEXT NOT NULL,
+        raw_request TEXT,
+        raw_response TEXT,
+        status_code INTEGER,
+        duration_ms INTEGER,
+        timestamp TEXT NOT NULL,
+        completed_at TEXT,
+        flow_id TEXT
+    )
+'''
+# Columns added after the first release, created on databases that predate them
+MIGRATED_COLUMNS = (('status_code', 'INTEGER'), ('flow_id', 'TEXT'))
+# Responses are matched to their request row by flow_id
+CREATE_FLOW_ID_INDEX_SQL = 'CREATE INDEX IF NOT EXISTS idx_requests_flow_id ON requests(flow_id)'
+INSERT_REQUEST_SQL = '''
+    INSERT INTO requests (
+        method, url, raw_request, timestamp, flow_id
+    )
+    VALUES (?, ?, ?, ?, ?)
+'''
+INSERT_RECORD_SQL = '''
+    INSERT INTO requests (
+        method, url, raw_request, timestamp, flow_id,
+        raw_response, status_code, duration_ms, completed_at
+    )
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+UPDATE_RESPONSE_SQL = '''
+    UPDATE requests 
+    SET raw_response = ?,
+        status_code = ?,
+        duration_ms = ?,
+        completed_at = ?
+    WHERE flow_id = ?
+'''
+
+# Project databases whose schema has already been checked by this process
+_ensured_paths = set()
+
+
+def _iso_from_ns(ns):
+    """Format an epoch-nanosecond timestamp the way datetime.utcnow().isoformat() does"""
+    seconds, remainder = divmod(ns, 1_000_000_000)
+    return datetime.utcfromtimestamp(seconds).replace(microsecond=remainder // 1000).isoformat()
+
+
+class ConnPool:
+    """Long-lived SQLite writer connection for a project database"""
+
+    PRAGMAS = (
+        'PRAGMA journal_mode=WAL',
+        'PRAGMA synchronous=NORMAL',
+        'PRAGMA cache_size=-64000',
+        'PRAGMA temp_store=MEMORY',
+        'PRAGMA busy_timeout=5000',
+    )
+
+    def __init__(self, db_path):
+        self.db_path = str(db_path)
+        # Connection is shared across threads, so writes are serialized
+        self.writer_lock = threading.Lock()
+        # Autocommit: batches open their own BEGIN IMMEDIATE transaction, so the driver
+        # doesn't need to track (and implicitly begin) transactions itself
+        self.writer = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+        for pragma in self.PRAGMAS:
+            self.writer.execute(pragma)
+
+    def close(self):
+        """Close the underlying connection"""
+        with self.writer_lock:
+            self.writer.close()
+
+
 class ProxyRecorder:
     def __init__(self):
         """Initialize the proxy recorder"""
+        # Ensure database is initialized (in case addon loads before Flask app)
+        try:
+            db.init_db()
+        except Exception as e:
+            logger.error(f"Error initializing database: {e}")
+        # Cached proxy_state rows, refreshed when the API signals a change
+        self._state_lock = threading.RLock()
+        self._state_cache = {}  # key -> value
+        self._state_version = None
+        self._state_dirty = True
         self.active_project_name = self._get_active_project()
-        # Store request IDs for updating with responses
-        self.request_map = {}  # flow.id -> db_request_id
+        # State version the active project was last read at
+        self._project_version = self._state_version
+        # Store the database each request was written to for updating with responses
+        self.request_map = {}  # flow.id -> db_path
+        # Requests held back until their response arrives so they are written in one INSERT
+        self.deferred_requests = {}  # flow.id -> (db_path, request row)
+        # Persistent connections keyed by project database path (only used by the flush thread)
+        self._pools = {}  # db_path -> ConnPool
+        # Request/response rows waiting to be written by the flush thread
+        self._write_queue = queue.Queue()
+        self._flush_thread = threading.Thread(target=self._flush_loop, daemon=True)
+        self._flush_thread.start()
         # Store intercepted flows waiting for user action
         self.intercepted_flows = {}  # flow.id -> flow
-        # Start background thread for periodic checks (tick doesn't work in mitmdump mode)
+        # Set whenever intercepted_flows changes, cleared once the change is saved
+        self._intercepted_dirty = False
+        # Flow IDs last written to intercepted_flows (None forces a full rewrite)
+        self._last_flushed_intercepted = None
+        # Saves run on both the mitmproxy thread and the periodic check thread
+        self._intercepted_lock = threading.Lock()
+        # Loopback socket the API pokes whenever it writes a proxy command
+        self._notify_sock = self._open_notify_socket()
+        # Start background thread for command checks (tick doesn't work in mitmdump mode)
         self._stop_thread = False
         self._check_thread = threading.Thread(target=self._periodic_check, daemon=True)
         self._check_thread.start()
         logger.info(f"ProxyRecorder initialized for project: {self.active_project_name}")
     
+    def _open_notify_socket(self):
+        """Bind the command notification socket and publish its port for the API"""
+        try:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            sock.bind(('127.0.0.1', 0))
+            sock.setblocking(False)
+            db.set_proxy_state('notify_port', str(sock.getsockname()[1]))
+            return sock
+        except Exception as e:
+            logger.error(f"Error opening notify socket, falling back to polling: {e}")
+            return None
+    
+    def _wait_for_notification(self):
+        """Block until the API signals a state change or the fallback timeout expires"""
+        if self._notify_sock is None:
+            time.sleep(POLL_INTERVAL)
+            self._invalidate_state()
+            return
+        ready, _, _ = select.select([self._notify_sock], [], [], NOTIFY_FALLBACK_TIMEOUT)
+        # Re-validate the state cache on every wakeup, including the fallback timeout
+        self._invalidate_state()
+        if not ready:
+            return
+        # Drain every pending datagram so a burst of writes costs one wakeup
+        while True:
+            try:
+                self._notify_sock.recv(64)
+            except OSError:
+                break
+    
     def _periodic_check(self):
-        """Background thread to periodically check for forward commands"""
+        """Background thread that applies forward commands when the API signals them"""
         while not self._stop_thread:
             try:
-                # Check every 100ms (same as tick would be)
-                time.sleep(0.1)
+                self._wait_for_notification()
+                if self._stop_thread:
+                    break
                 self._check_forward_commands()
                 
                 # Also check if intercept was disabled and we still have flows to forward
@@ -56,150 +205,126 @@ class ProxyRecorder:
                     if not intercept_enabled:
                         # Intercept was disabled but we still have flows - forward them immediately
                         self._forward_all_intercepted()
-                        self._save_intercepted_flows_info()
-                
-                # Sync intercepted flows from memory to database periodically
-                if self.intercepted_flows and self.active_project_name:
-                    self._save_intercepted_flows_info()
             except Exception as e:
                 logger.error(f"Error in periodic check thread: {e}")
     
+    def _invalidate_state(self):
+        """Mark cached proxy state as needing a version check"""
+        with self._state_lock:
+            self._state_dirty = True
+    
+    def _refresh_state(self):
+        """Reload cached proxy state if its version changed in the database"""
+        with self._state_lock:
+            if not self._state_dirty:
+                return
+            version = db.get_proxy_state_version()
+            if version != self._state_version:
+                self._state_cache = db.get_all_proxy_state()
+                self._state_version = version
+            self._state_dirty = False
+    
+    def _get_state(self, key, default=None):
+        """Get a proxy state value from the cache"""
+        with self._state_lock:
+            try:
+                self._refresh_state()
+            except Exception as e:
+                logger.error(f"Error refreshing proxy state from database: {e}")
+            return self._state_cache.get(key, default)
+    
+    def _set_state(self, key, value):
+        """Write a proxy state value to the database and the cache"""
+        with self._state_lock:
+            db.set_proxy_state(key, value)
+            self._state_cache[key] = value
+            # Our own write bumped the version; re-check on next read
+            self._state_dirty = True
+    
     def _get_active_project(self):
         """Get the active project name from database"""
-        try:
-            # Ensure database is initialized (in case addon loads before Flask app)
-            db.init_db()
-            return db.get_proxy_state('active_project')
-        except Exception as e:
-            logger.error(f"Error reading active project from database: {e}")
-            return None
+        return self._get_state('active_project')
     
     def _get_intercept_enabled(self):
         """Get intercept state from database"""
-        try:
-            value = db.get_proxy_state('intercept_enabled', 'false')
-            return value.lower() == 'true'
-        except Exception as e:
-            logger.error(f"Error reading intercept state from database: {e}")
-            return False
+        value = self._get_state('intercept_enabled', 'false')
+        return value.lower() == 'true'
     
     def _save_intercepted_flows_info(self):
         """Save intercepted flows to database (only flow IDs)"""
         if not self.active_project_name:
             return
-        
-        try:
-            # First, clear all existing intercepted flows for this project
-            db.clear_intercepted_flows(self.active_project_name)
-            
-            # Then, save all current intercepted flow IDs
-            for flow_id in list(self.intercepted_flows.keys()):
-                db.add_intercepted_flow(self.active_project_name, flow_id)
-        except Exception as e:
-            logger.error(f"Error saving intercepted flows to database: {e}")
+        with self._intercepted_lock:
+            if not self._intercepted_dirty and self._last_flushed_intercepted is not None:
+                return
+            # Cleared before the snapshot, so a change made while writing triggers another save
+            self._intercepted_dirty = False
+            try:
+                current = frozenset(list(self.intercepted_flows.keys()))
+                previous = self._last_flushed_intercepted
+                if previous is None:
+                    # Unknown database contents (startup or project switch) - rewrite the whole set
+                    db.update_intercepted_flows(self.active_project_name, current, (), replace=True)
+                else:
+                    added = current - previous
+                    removed = previous - current
+                    if added or removed:
+                        db.update_intercepted_flows(self.active_project_name, added, removed)
+                self._last_flushed_intercepted = current
+            except Exception as e:
+                self._intercepted_dirty = True
+                logger.error(f"Error saving intercepted flows to database: {e}")
     
     def _check_forward_commands(self):
-        """Check for forward commands from API via database"""
+        """Apply forward/drop commands queued by the API, in the order they were issued"""
         try:
-            # Check for forward_all command
-            forward_all = db.get_proxy_state('forward_all', 'false')
-            if forward_all.lower() == 'true':
-                self._forward_all_intercepted()
-                db.set_proxy_state('forward_all', 'false')
-                return
-            
-            # Check for individual flow drop commands first (so they take precedence)
-            drop_flows_json = db.get_proxy_state('drop_flows', '[]')
+            commands = db.take_pending_commands()
+        except Exception as e:
+            logger.error(f"Error checking forward commands: {e}")
+            return
+        
+        flows_changed = False
+        for op, flow_id, payload in commands:
             try:
-                drop_flows = json.loads(drop_flows_json) if drop_flows_json else []
-            except:
-                drop_flows = []
-            
-            if drop_flows:
-                flows_dropped = False
-                for flow_id_str in drop_flows:
-                    try:
-                        flow_id = flow_id_str if isinstance(flow_id_str, str) else str(flow_id_str)
-                        # Find flow by ID (mitmproxy uses string IDs)
-                        flow = self.intercepted_flows.get(flow_id)
-                        if flow:
-                            # Kill the flow (drop it)
-                            flow.kill()
-                            del self.intercepted_flows[flow_id]
-                            # Remove from database
-                            db.remove_intercepted_flow(self.active_project_name, flow_id)
-                            flows_dropped = True
-                            logger.info(f"Dropped intercepted flow {flow_id}: {flow.request.method} {flow.request.pretty_url}")
-                    except Exception as e:
-                        logger.error(f"Error dropping flow {flow_id_str}: {e}")
-                
-                # Save intercepted flows info immediately if any were dropped
-                if flows_dropped:
-                    self._save_intercepted_flows_info()
+                if op == 'forward_all':
+                    if self.intercepted_flows:
+                        self._forward_all_intercepted()
+                    continue
                 
-                # Clear drop commands
-                db.set_proxy_state('drop_flows', '[]')
-            
-            # Check for individual flow forward commands
-            forward_flows_json = db.get_proxy_state('forward_flows', '[]')
-            try:
-                forward_flows = json.loads(forward_flows_json) if forward_flows_json else []
-            except:
-                forward_flows = []
-            
-            if forward_flows:
-                flows_forwarded = False
-                edited_requests_json = db.get_proxy_state('edited_requests', '{}')
-                try:
-                    edited_requests = json.loads(edited_requests_json) if edited_requests_json else {}
-                except:
-                    edited_requests = {}
+                # Find flow by ID (mitmproxy uses string IDs)
+                flow = self.intercepted_flows.pop(flow_id, None)
+                if not flow:
+                    continue
+                self._intercepted_dirty = True
+                flows_changed = True
                 
-                for flow_id_str in forward_flows:
-                    try:
-                        flow_id = flow_id_str if isinstance(flow_id_str, str) else str(flow_id_str)
-                        # Find flow by ID (mitmproxy uses string IDs)
-                        flow = self.intercepted_flows.get(flow_id)
-                        if flow:
-                            # Check if there's an edited request
-                            edited_request = edited_requests.get(flow_id)
-                            if edited_request:
-                                # Parse and apply edited request
-                                try:
-                                    # This is a simplified approach - in production you'd want proper HTTP parsing
-                                    # For now, we'll just resume with the original request
-                                    # TODO: Implement proper request editing
-                                    logger.info(f"Forwarding flow {flow_id} with edited request (editing not fully implemented)")
-                                except Exception as e:
-                                    logger.error(f"Error applying edited request to flow {flow_id}: {e}")
-                            
-                            # Forward the flow
-                            flow.resume()
-                            del self.intercepted_flows[flow_id]
-                            # Remove from database
-                            db.remove_intercepted_flow(self.active_project_name, flow_id)
-                            flows_forwarded = True
-                            logger.info(f"Forwarded intercepted flow {flow_id}: {flow.request.method} {flow.request.pretty_url}")
-                    except Exception as e:
-                        logger.error(f"Error forwarding flow {flow_id_str}: {e}")
+                if op == 'drop':
+                    # Kill the flow (drop it)
+                    flow.kill()
+                    logger.info(f"Dropped intercepted flow {flow_id}: {flow.request.method} {flow.request.pretty_url}")
+                    continue
                 
-                # Save intercepted flows info immediately if any were forwarded
-                if flows_forwarded:
-                    self._save_intercepted_flows_info()
+                if payload:
+                    # This is a simplified approach - in production you'd want proper HTTP parsing
+                    # For now, we'll just resume with the original request
+                    # TODO: Implement proper request editing
+                    logger.info(f"Forwarding flow {flow_id} with edited request (editing not fully implemented)")
                 
-                # Clear forward commands
-                db.set_proxy_state('forward_flows', '[]')
-                # Clean up edited requests for forwarded flows
-                for flow_id_str in forward_flows:
-                    edited_requests.pop(flow_id_str, None)
-                db.set_proxy_state('edited_requests', json.dumps(edited_requests))
-        except Exception as e:
-            logger.error(f"Error checking forward commands: {e}")
+                # Forward the flow
+                flow.resume()
+                logger.info(f"Forwarded intercepted flow {flow_id}: {flow.request.method} {flow.request.pretty_url}")
+            except Exception as e:
+                logger.error(f"Error applying {op} command to flow {flow_id}: {e}")
+        
+        # Save intercepted flows info immediately if any were forwarded or dropped
+        if flows_changed:
+            self._save_intercepted_flows_info()
     
     def _forward_all_intercepted(self):
         """Forward all intercepted flows when intercept is disabled"""
         flows_to_forward = list(self.intercepted_flows.values())
         self.intercepted_flows.clear()
+        self._intercepted_dirty = True
         
         # Save immediately after clearing to update the file
         self._save_intercepted_flows_info()
@@ -220,37 +345,148 @@ class ProxyRecorder:
         # This ensures we use the backend/projects_data directory, not src/projects_data
         return db.get_project_db_path(project_name)
     
+    def _get_pool(self, db_path):
+        """Get (or open) the connection pool for a project database"""
+        key = str(db_path)
+        pool = self._pools.get(key)
+        if pool is None:
+            pool = ConnPool(key)
+            if key not in _ensured_paths:
+                with pool.writer_lock:
+                    self._ensure_table(pool.writer.cursor())
+                _ensured_paths.add(key)
+            self._pools[key] = pool
+        return pool
+    
+    def _reset_pools(self):
+        """Close cached connections once queued writes are flushed (called when the active project changes)"""
+        self._write_queue.put(('reset', None, None))
+    
+    def _close_pools(self):
+        """Close all cached connections (flush thread only)"""
+        pools = list(self._pools.values())
+        self._pools.clear()
+        for pool in pools:
+            try:
+                pool.close()
+            except sqlite3.Error as e:
+                logger.warning(f"Error closing connection for {pool.db_path}: {e}")
+    
+    def _flush_loop(self):
+        """Background thread that writes queued request/response rows in batches"""
+        while True:
+            item = self._write_queue.get()
+            if item is None:
+                return
+            batch = [item]
+            deadline = time.monotonic() + FLUSH_INTERVAL
+            while len(batch) < FLUSH_BATCH_SIZE:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self._write_queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._flush(batch)
+                    return
+                batch.append(item)
+            self._flush(batch)
+    
+    def _flush(self, batch):
+        """Write a batch of queued operations, one transaction per database"""
+        pending = {}  # db_path -> (insert_rows, update_rows, record_rows)
+        for op, db_path, row in batch:
+            if op == 'reset':
+                self._write_pending(pending)
+                pending = {}
+                self._close_pools()
+                continue
+            insert_rows, update_rows, record_rows = pending.setdefault(db_path, ([], [], []))
+            # Timestamps are queued as epoch nanoseconds and formatted here, off the proxy's event loop
+            if op == 'insert':
+                method, url, request, timestamp_ns, flow_id = row
+                insert_rows.append((method, url, self._assemble(assemble_request, request), _iso_from_ns(timestamp_ns), flow_id))
+            elif op == 'record':
+                method, url, request, timestamp_ns, flow_id, response, status_code, duration_ms, completed_ns = row
+                record_rows.append((
+                    method, url, self._assemble(assemble_request, request), _iso_from_ns(timestamp_ns), flow_id,
+                    self._assemble(assemble_response, response), status_code, duration_ms, _iso_from_ns(completed_ns)
+                ))
+            else:
+                response, status_code, duration_ms, completed_ns, flow_id = row
+                update_rows.append((self._assemble(assemble_response, response), status_code, duration_ms, _iso_from_ns(completed_ns), flow_id))
+        self._write_pending(pending)
+    
+    def _assemble(self, assemble, message):
+        """Serialize a request or response to raw HTTP bytes (flush thread only)"""
+        if message is None:
+            return None
+        try:
+            return assemble(message)
+        except Exception as e:
+            logger.warning(f"Could not assemble {type(message).__name__.lower()}: {e}", exc_info=True)
+            return None
+    
+    def _write_pending(self, pending):
+        """Insert then update rows for each database in a single transaction"""
+        for db_path, (insert_rows, update_rows, record_rows) in pending.items():
+            count = len(insert_rows) + len(update_rows) + len(record_rows)
+            for attempt in range(WRITE_ATTEMPTS):
+                try:
+                    pool = self._get_pool(db_path)
+                    self._write_batch(pool, insert_rows, update_rows, record_rows)
+                    logger.info(f"Recorded {len(insert_rows) + len(record_rows)} requests and {len(update_rows) + len(record_rows)} responses")
+                    break
+                except sqlite3.OperationalError as e:
+                    # Another process holding the database past busy_timeout is expected under load
+                    if (e.sqlite_errorcode & 0xFF) in (sqlite3.SQLITE_BUSY, sqlite3.SQLITE_LOCKED) and attempt + 1 < WRITE_ATTEMPTS:
+                        logger.warning(f"Database {db_path} is busy, retrying {count} rows")
+                        time.sleep(WRITE_RETRY_DELAY * (2 ** attempt))
+                        continue
+                    # The database may have been recreated underneath us; re-check its schema next time
+                    _ensured_paths.discard(str(db_path))
+                    logger.error(f"Error writing {count} rows to {db_path}: {e}")
+                    break
+                except sqlite3.Error as e:
+                    _ensured_paths.discard(str(db_path))
+                    logger.error(f"Error writing {count} rows to {db_path}: {e}")
+                    break
+                except Exception as e:
+                    logger.error(f"Unexpected error writing {count} rows to {db_path}: {e}", exc_info=True)
+                    break
+    
+    def _write_batch(self, pool, insert_rows, update_rows, record_rows):
+        """Write one database's rows in a single transaction"""
+        with pool.writer_lock:
+            # Take the write lock up front so the batch doesn't hit SQLITE_BUSY mid-transaction
+            pool.writer.execute('BEGIN IMMEDIATE')
+            try:
+                if insert_rows:
+                    pool.writer.executemany(INSERT_REQUEST_SQL, insert_rows)
+                if update_rows:
+                    pool.writer.executemany(UPDATE_RESPONSE_SQL, update_rows)
+                if record_rows:
+                    pool.writer.executemany(INSERT_RECORD_SQL, record_rows)
+                pool.writer.commit()
+            except Exception:
+                pool.writer.rollback()
+                raise
+    
     def _ensure_table(self, cursor):
         """Ensure the requests table exists with proper schema"""
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS requests (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                method TEXT NOT NULL,
-                url TEXT NOT NULL,
-                raw_request TEXT,
-                raw_response TEXT,
-                status_code INTEGER,
-                duration_ms INTEGER,
-                timestamp TEXT NOT NULL,
-                completed_at TEXT,
-                flow_id TEXT
-            )
-        ''')
-        # Add status_code column if it doesn't exist (for existing databases)
-        try:
-            cursor.execute('ALTER TABLE requests ADD COLUMN status_code INTEGER')
-        except sqlite3.OperationalError:
-            # Column already exists, ignore
-            pass
-        # Add flow_id column if it doesn't exist (for existing databases)
-        try:
-            cursor.execute('ALTER TABLE requests ADD COLUMN flow_id TEXT')
-        except sqlite3.OperationalError:
-            # Column already exists, ignore
-            pass
+        cursor.execute(CREATE_REQUESTS_SQL)
+        # Add columns missing from older databases
+        cursor.execute('PRAGMA table_info(requests)')
+        existing = {row[1] for row in cursor.fetchall()}
+        for column, column_type in MIGRATED_COLUMNS:
+            if column not in existing:
+                cursor.execute(f'ALTER TABLE requests ADD COLUMN {column} {column_type}')
+        cursor.execute(CREATE_FLOW_ID_INDEX_SQL)
     
-    def _save_request(self, flow: http.HTTPFlow):
-        """Save request immediately when it's sent"""
+    def _save_request(self, flow: http.HTTPFlow, defer: bool = False):
+        """Queue the request to be saved as soon as it's sent (or hold it for its response if defer)"""
         if not self.active_project_name:
             logger.debug("No active project, skipping request save")
             return None
@@ -259,186 +495,172 @@ class ProxyRecorder:
         if not db_path:
             return None
         
-        try:
-            conn = sqlite3.connect(str(db_path))
-            cursor = conn.cursor()
-            self._ensure_table(cursor)
-            
-            # Extract basic info for indexing
-            method = flow.request.method
-            url = flow.request.pretty_url
-            
-            # Capture raw HTTP request
-            try:
-                raw_request_bytes = assemble_request(flow.request)
-                raw_request = raw_request_bytes.decode('utf-8', errors='replace')
-            except Exception as e:
-                logger.warning(f"Could not assemble request: {e}", exc_info=True)
-                raw_request = None
-            
-            # Insert the request (without response data yet)
-            now = datetime.utcnow().isoformat()
-            flow_id_str = str(flow.id)
-            cursor.execute('''
-                INSERT INTO requests (
-                    method, url, raw_request, timestamp, flow_id
-                )
-                VALUES (?, ?, ?, ?, ?)
-            ''', (method, url, raw_request, now, flow_id_str))
-            
-            request_id = cursor.lastrowid
-            conn.commit()
-            conn.close()
-            
-            logger.info(f"Recorded request {request_id}: {method} {url}")
-            return request_id
-            
-        except Exception as e:
-            logger.error(f"Error saving request: {e}", exc_info=True)
-            return None
-    
-    def _update_with_response(self, request_id, flow: http.HTTPFlow, duration_ms):
-        """Update the request record with response data"""
-        if not self.active_project_name:
-            return
+        # Extract basic info for indexing
+        request = flow.request
+        method = request.method
+        url = request.pretty_url
         
-        db_path = self._get_project_db_path(self.active_project_name)
-        if not db_path:
-            return
+        # The flush thread assembles the raw HTTP request (stored as bytes, decoded
+        # by readers on demand), so no full-size copy is made on the event loop
+        now = time.time_ns()
+        flow_id_str = str(flow.id)
+        row = (method, url, request, now, flow_id_str)
+        if defer:
+            # Written together with the response in response()/error()
+            self.deferred_requests[flow.id] = (db_path, row)
+            return db_path
         
-        try:
-            conn = sqlite3.connect(str(db_path))
-            cursor = conn.cursor()
-            
-            # Capture raw HTTP response
-            try:
-                raw_response_bytes = assemble_response(flow.response)
-                raw_response = raw_response_bytes.decode('utf-8', errors='replace')
-            except Exception as e:
-                logger.warning(f"Could not assemble response: {e}", exc_info=True)
-                raw_response = None
-            
-            # Extract status code
-            status_code = flow.response.status_code if flow.response else None
-            
-            # Update the request with response data
-            completed_at = datetime.utcnow().isoformat()
-            cursor.execute('''
-                UPDATE requests 
-                SET raw_response = ?,
-                    status_code = ?,
-                    duration_ms = ?,
-                    completed_at = ?
-                WHERE id = ?
-            ''', (raw_response, status_code, duration_ms, completed_at, request_id))
-            
-            conn.commit()
-            conn.close()
-            
-            logger.info(f"Updated request {request_id} with response: {status_code} ({duration_ms}ms)")
-            
-        except Exception as e:
-            logger.error(f"Error updating response: {e}", exc_info=True)
+        # Insert the request (without response data yet)
+        self._write_queue.put(('insert', db_path, row))
+        
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Queued request {flow_id_str}: {method} {url}")
+        return db_path
     
-    def requestheaders(self, flow: http.HTTPFlow):
-        """Called when request headers are received (before body)"""
-        # Check for forward commands periodically
-        self._check_forward_commands()
+    def _update_with_response(self, db_path, flow: http.HTTPFlow, duration_ms) -> None:
+        """Queue an update of the request record with response data"""
+        # The response is finished once this hook runs, so the flush thread
+        # assembles it into raw bytes instead of blocking the event loop here
+        response = flow.response
         
-        # Check if project has changed
+        # Extract status code
+        status_code = response.status_code if response else None
+        
+        # Update the request with response data
+        completed_at = time.time_ns()
+        flow_id_str = str(flow.id)
+        self._write_queue.put(('update', db_path, (response, status_code, duration_ms, completed_at, flow_id_str)))
+        
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Queued response for {flow_id_str}: {status_code} ({duration_ms}ms)")
+    
+    def _save_full_record(self, db_path, row, flow: http.HTTPFlow, duration_ms) -> None:
+        """Queue a single insert of a deferred request together with its response"""
+        response = flow.response
+        status_code = response.status_code if response else None
+        self._write_queue.put(('record', db_path, row + (response, status_code, duration_ms, time.time_ns())))
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Queued request and response for {row[4]}: {status_code} ({duration_ms}ms)")
+    
+    def _save_deferred_request(self, flow_id) -> bool:
+        """Queue a deferred request on its own when no response is coming"""
+        deferred = self.deferred_requests.pop(flow_id, None)
+        if not deferred:
+            return False
+        db_path, row = deferred
+        self._write_queue.put(('insert', db_path, row))
+        return True
+    
+    def _check_project_switch(self) -> None:
+        """Switch to a newly activated project (a single integer compare when nothing changed)"""
+        if not self._state_dirty and self._project_version == self._state_version:
+            return
         new_project = self._get_active_project()
+        self._project_version = self._state_version
         if new_project != self.active_project_name:
             self.active_project_name = new_project
             logger.info(f"Switched to project: {self.active_project_name}")
+            # Drop connections to the previous project's database
+            self._reset_pools()
+            with self._intercepted_lock:
+                self._last_flushed_intercepted = None
             # Clear old intercepted flows when project changes
             if self.intercepted_flows:
                 self.intercepted_flows.clear()
+                self._intercepted_dirty = True
                 self._save_intercepted_flows_info()
     
-    def request(self, flow: http.HTTPFlow):
+    def requestheaders(self, flow: http.HTTPFlow) -> None:
+        """Called when request headers are received (before body)"""
+        # Check if project has changed
+        self._check_project_switch()
+    
+    def request(self, flow: http.HTTPFlow) -> None:
         """Called when request is complete (headers + body)"""
         # Check if project has changed
-        new_project = self._get_active_project()
-        if new_project != self.active_project_name:
-            self.active_project_name = new_project
-            logger.info(f"Switched to project: {self.active_project_name}")
-            # Clear old intercepted flows when project changes
-            if self.intercepted_flows:
-                self.intercepted_flows.clear()
-                self._save_intercepted_flows_info()
+        self._check_project_switch()
         
         # Check intercept state
         intercept_enabled = self._get_intercept_enabled()
         
-        # Check for forward commands
-        self._check_forward_commands()
-        
+        flow_id = flow.id
         if intercept_enabled:
             # Intercept is ON - stop the flow and wait for user action
             flow.intercept()
-            self.intercepted_flows[str(flow.id)] = flow
+            self.intercepted_flows[str(flow_id)] = flow
+            self._intercepted_dirty = True
             self._save_intercepted_flows_info()
             logger.info(f"Intercepted request {flow.id}: {flow.request.method} {flow.request.pretty_url}")
         else:
             # Intercept is OFF - forward all queued flows first
             if self.intercepted_flows:
                 self._forward_all_intercepted()
-                self._save_intercepted_flows_info()
         
-        # Save the request - body should be available now
-        request_id = self._save_request(flow)
-        if request_id:
-            # Store the mapping so we can update it when response arrives
-            self.request_map[flow.id] = request_id
-            # Store the timestamp for duration calculation
-            flow.metadata['request_timestamp'] = datetime.utcnow()
-    
-    def response(self, flow: http.HTTPFlow):
+        # Save the request - body should be available now. Flows that aren't held for the
+        # user are written once, together with their response, instead of insert + update
+        db_path = self._save_request(flow, defer=not intercept_enabled)
+        if db_path:
+            # Store the mapping so we can update it when response arrives (deferred
+            # requests carry their own database path)
+            if intercept_enabled:
+                self.request_map[flow_id] = db_path
+            # Store a monotonic timestamp for duration calculation
+            flow.metadata['request_start_ns'] = time.monotonic_ns()
+    
+    def response(self, flow: http.HTTPFlow) -> None:
         """Called when a response is received"""
-        try:
-            # Remove from intercepted flows if it was intercepted
-            flow_id_str = str(flow.id)
-            if flow_id_str in self.intercepted_flows:
-                del self.intercepted_flows[flow_id_str]
-                db.remove_intercepted_flow(self.active_project_name, flow_id_str)
-                self._save_intercepted_flows_info()
-            
-            # Calculate duration
-            if 'request_timestamp' in flow.metadata:
-                duration = datetime.utcnow() - flow.metadata['request_timestamp']
-                duration_ms = int(duration.total_seconds() * 1000)
-            else:
-                duration_ms = None
-            
-            # Get the request ID we saved earlier
-            request_id = self.request_map.get(flow.id)
-            if request_id:
-                # Update the request with response data
-                self._update_with_response(request_id, flow, duration_ms)
-                # Clean up the mapping
-                del self.request_map[flow.id]
-            
-        except Exception as e:
-            logger.error(f"Error processing response: {e}", exc_info=True)
+        flow_id = flow.id
+        # Remove from intercepted flows if it was intercepted
+        if self.intercepted_flows and self.intercepted_flows.pop(str(flow_id), None) is not None:
+            self._intercepted_dirty = True
+            self._save_intercepted_flows_info()
+        
+        # Calculate duration
+        start_ns = flow.metadata.get('request_start_ns')
+        if start_ns is not None:
+            duration_ms = (time.monotonic_ns() - start_ns) // 1_000_000
+        else:
+            duration_ms = None
+        
+        # Write deferred requests and their response in one row
+        deferred = self.deferred_requests.pop(flow_id, None)
+        if deferred:
+            db_path, row = deferred
+            self._save_full_record(db_path, row, flow, duration_ms)
+            return
+        
+        # Get the database we saved the request to earlier (and clean up the mapping)
+        db_path = self.request_map.pop(flow_id, None)
+        if db_path:
+            # Update the request with response data
+            self._update_with_response(db_path, flow, duration_ms)
     
-    def error(self, flow: http.HTTPFlow):
+    def error(self, flow: http.HTTPFlow) -> None:
         """Called when an error occurs"""
-        try:
-            # Remove from intercepted flows if it was intercepted
-            flow_id_str = str(flow.id)
-            if flow_id_str in self.intercepted_flows:
-                del self.intercepted_flows[flow_id_str]
-                db.remove_intercepted_flow(self.active_project_name, flow_id_str)
-                self._save_intercepted_flows_info()
-            
-            # Log the error
-            request_id = self.request_map.get(flow.id)
-            if request_id:
-                logger.warning(f"Request {request_id} failed: {flow.error}")
-                # Clean up the mapping
-                del self.request_map[flow.id]
-        except Exception as e:
-            logger.error(f"Error handling error: {e}", exc_info=True)
+        # Remove from intercepted flows if it was intercepted
+        flow_id_str = str(flow.id)
+        if flow_id_str in self.intercepted_flows:
+            del self.intercepted_flows[flow_id_str]
+            self._intercepted_dirty = True
+            self._save_intercepted_flows_info()
+        
+        # Failed requests are still recorded, just without a response
+        recorded = self._save_deferred_request(flow.id)
+        
+        # Log the error (and clean up the mapping)
+        if self.request_map.pop(flow.id, None) is not None or recorded:
+            logger.warning(f"Request {flow.id} failed: {flow.error}")
+    
+    def done(self):
+        """Called when the addon shuts down - flush any queued writes"""
+        self._stop_thread = True
+        # Requests still waiting for a response are saved without one
+        for flow_id in list(self.deferred_requests):
+            self._save_deferred_request(flow_id)
+        self._write_queue.put(None)
+        self._flush_thread.join(timeout=5)
+        if self._notify_sock is not None:
+            self._notify_sock.close()
     
     def tick(self):
         """Called periodically by mitmproxy (if available) - but tick doesn't work in mitmdump mode"""
@@ -1,8 +1,7 @@
 """
 API endpoints for agent functionality using OpenAI Completions API.
 """
-from flask import Blueprint, request, jsonify
-from openai import OpenAI
+from flask import Blueprint, Response, request, jsonify, stream_with_context
 from .. import db, state
 from .tools import (
     get_query_database_tool, 
@@ -12,25 +11,255 @@ from .tools import (
     send_request,
     browse
 )
+import atexit
+import concurrent.futures
+from collections import OrderedDict
 import json
 import logging
 import os
+import threading
 
 logger = logging.getLogger(__name__)
 
 agent_bp = Blueprint('agent', __name__)
 
-# Initialize OpenAI client
+# Model and API key are fixed for the life of the process (the shared client
+# below is also created once), so read them at import
+MODEL = os.environ.get("MODEL", "gpt-5-mini")
+_OPENAI_API_KEY = os.environ.get('OPENAI_API_KEY')
+AI_CONFIGURED = _OPENAI_API_KEY is not None and _OPENAI_API_KEY.strip() != ''
+
+# Shared OpenAI client so every agent turn reuses the same connection pool
 client = None
+_client_lock = threading.Lock()
+
 def get_openai_client():
+    """Get the shared OpenAI client, creating it on first use"""
     global client
-    client = OpenAI()
+    if client is None:
+        with _client_lock:
+            if client is None:
+                from openai import OpenAI
+                client = OpenAI()
+                atexit.register(client.close)
     return client
 
+# Recent chat histories (user and assistant messages) keyed by (project_id, chat_id),
+# so a new turn doesn't re-read the whole chat from the project database
+CHAT_HISTORY_CACHE_SIZE = 256
+_chat_history_cache = OrderedDict()
+_chat_history_lock = threading.Lock()
+# Chats with an agent turn in progress, as (project_id, chat_id)
+_active_chats = set()
+
+# Long chats are compacted before being sent to the model: once more than
+# CHAT_SUMMARY_THRESHOLD messages aren't covered by the chat's stored summary, the
+# older ones are folded into it and only the last CHAT_RECENT_MESSAGES stay verbatim
+CHAT_SUMMARY_THRESHOLD = 20
+CHAT_RECENT_MESSAGES = 10
+SUMMARY_MODEL = os.environ.get("SUMMARY_MODEL", MODEL)
+
+# Agent chats run here when the caller asks for background processing, so the
+# request thread is released while the model and tools are working
+AGENT_BACKGROUND_WORKERS = 8
+# Tools slow enough that a synchronous chat request hands the rest of its turn
+# to the background once the model calls one of them
+BACKGROUND_TOOLS = frozenset({'browse'})
+_agent_executor = concurrent.futures.ThreadPoolExecutor(
+    max_workers=AGENT_BACKGROUND_WORKERS, thread_name_prefix='agent-chat'
+)
+
+# Streamed text deltas are sent in batches that start small (fast first token)
+# and grow geometrically so long answers don't cost one SSE frame per token
+SSE_MIN_BATCH_SIZE = 8
+SSE_MAX_BATCH_SIZE = 512
+SSE_BATCH_GROWTH = 2
+
+# Tool name -> handler(tool_args, db_path); the resender only gets query_database
+_TOOL_DISPATCH = {
+    "query_database": lambda args, db_path: query_database(args.get('sql_query', ''), db_path),
+    "send_request": lambda args, db_path: send_request(
+        args.get('raw_request', ''),
+        args.get('host', 'example.com'),
+        args.get('port', '443'),
+        args.get('use_https')
+    ),
+    "browse": lambda args, db_path: browse(args.get('task', ''), args.get('additional_tasks', None)),
+}
+_RESENDER_TOOL_DISPATCH = {"query_database": _TOOL_DISPATCH["query_database"]}
+
+# Step log descriptions for tool calls
+_STEP_DESCRIPTIONS = {
+    "query_database": "Querying database",
+    "send_request": "Sending HTTP request",
+    "browse": "Browsing the web"
+}
+
+# Step log descriptions for tool results, built from each tool's output
+_RESULT_DESCRIPTIONS = {
+    "query_database": lambda output: f"Found {output.get('count', 0)} requests",
+    "send_request": lambda output: (
+        f"Request failed: {output.get('error')}" if output.get('error')
+        else f"Received response: {output.get('status_code', 0)}"
+    ),
+    "browse": lambda output: (
+        f"Browse failed: {output.get('error', 'Unknown error')}" if output.get('status') == 'error'
+        else output.get('message', 'Browse completed')
+    ),
+}
+
+# Agent tool calls run here, so several calls of a turn (and calls started while the
+# model is still streaming the rest of its answer) execute concurrently
+AGENT_TOOL_WORKERS = 16
+_tool_executor = concurrent.futures.ThreadPoolExecutor(
+    max_workers=AGENT_TOOL_WORKERS, thread_name_prefix='agent-tool'
+)
+
+# Tool results go back to the model as compact JSON (no whitespace after separators),
+# using one shared encoder instead of building one per json.dumps call
+_dumps_tool_output = json.JSONEncoder(separators=(',', ':')).encode
+# Long strings in tool results (raw requests/responses, page dumps) are cut to
+# this many characters in what the model sees; the step log keeps them whole
+TOOL_OUTPUT_MAX_CHARS = 2048
+
+# Tool definitions (Completions API format) - the schemas are constant, so build them once
+_CHAT_TOOLS = [
+    get_query_database_tool(),
+    get_send_request_tool(),
+    get_browse_tool()
+]
+# The resender copilot only gets the query_database tool (no send_request or browse)
+_RESENDER_TOOLS = [
+    get_query_database_tool()
+]
+
+# System prompt for the agent chat
+_CHAT_SYSTEM_MSG = """You are a helpful DAST tool for cybersecurity professionals that can query a database of HTTP requests using SQL, send HTTP requests, and browse the web.
+
+You have three main capabilities:
+
+1. QUERY DATABASE: You can query the database of captured HTTP requests using SQL SELECT queries.
+   The database has a 'requests' table with these fields:
+   - id: INTEGER (primary key)
+   - method: TEXT (HTTP method: GET, POST, PUT, DELETE, etc.)
+   - url: TEXT (full URL)
+   - status_code: INTEGER (HTTP status code: 200, 404, 500, etc.)
+   - timestamp: TEXT (ISO timestamp, use for ordering - DESC = newest first, ASC = oldest first)
+   - raw_request: TEXT (full request)
+   - raw_response: TEXT (full response)
+   - duration_ms: INTEGER (request duration)
+   - completed_at: TEXT (completion timestamp)
+   - flow_id: TEXT (proxy flow ID)
+
+   When users ask about requests, construct a SQL SELECT query:
+   - Use WHERE for filtering (method = 'GET', url LIKE '%keyword%', status_code = 404)
+   - Use ORDER BY timestamp DESC for newest/recent requests
+   - Use ORDER BY timestamp ASC for oldest/first requests  
+   - Use LIMIT to restrict results (LIMIT 1 for "first", LIMIT 10 for "last 10", etc.)
+   - Combine conditions with AND: WHERE method = 'POST' AND url LIKE '%api%'
+
+   Examples:
+   - User: "GET requests" → SELECT * FROM requests WHERE method = 'GET' ORDER BY timestamp DESC LIMIT 100
+   - User: "first request" → SELECT * FROM requests ORDER BY timestamp ASC LIMIT 1
+   - User: "login requests" → SELECT * FROM requests WHERE url LIKE '%login%' ORDER BY timestamp DESC LIMIT 100
+
+2. SEND REQUESTS: You can send HTTP requests to any host, similar to the resender functionality.
+   Use this when users ask you to:
+   - Send a request
+   - Test an endpoint
+   - Resend a modified request
+   - Make a new API call
+   
+   To send a request, provide the raw_request string with the full HTTP request including:
+   - Request line: METHOD PATH HTTP/VERSION
+   - Headers (Host, Content-Type, etc.)
+   - Optional body (for POST/PUT/PATCH)
+   
+   Example raw_request:
+   ```
+   POST /api/users HTTP/1.1
+   Host: api.example.com
+   Content-Type: application/json
+   
+   {"name": "John", "email": "john@example.com"}
+   ```
+   
+   You can also specify host, port, and use_https to control where the request is sent.
+
+3. BROWSE: You can control an automated browser to navigate websites, interact with pages, and perform browsing tasks.
+   Use this when users ask you to:
+   - Browse a website
+   - Search for something
+   - Navigate to a URL
+   - Interact with web pages (click buttons, fill forms, etc.)
+   - Perform web-based security testing
+   
+   The browser automatically uses a proxy to capture all HTTP requests and responses, which are then stored in the database.
+   
+   Examples:
+   - User says "browse to example.com" → use browse with task "navigate to https://example.com"
+   - User says "search for dogs" → use browse with task "search for dogs"
+   - User says "go to login page and fill the form" → use browse with task "go to the login page and fill out the form"
+   
+   You can optionally provide additional_tasks to execute multiple steps sequentially.
+
+AFTER YOU BROWSE, THE PACKETS WILL BE STORED IN THE DATABASE. YOU CAN QUERY THE DATABASE TO GET THE PACKETS.
+After executing queries, sending requests, or browsing, analyze results and provide clear summaries."""
+
+# System prompt for summarizing the older part of a long agent chat
+_SUMMARY_SYSTEM_MSG = """You summarize conversations between a user and a DAST assistant that queries captured HTTP requests, sends requests, and browses the web.
+Write a concise summary of the conversation so far that preserves everything needed to continue it: the user's goals, targets (hosts, URLs, endpoints, parameters), findings, request IDs, and any open questions or next steps.
+If a previous summary is provided, merge it with the new messages into a single updated summary. Return only the summary."""
+
+# System prompt for the resender copilot - focused on editing HTTP requests with database context
+_RESENDER_SYSTEM_MSG = """You are an AI copilot for editing HTTP requests in a resender tool. You can query a database of HTTP requests using SQL to help you understand the context and modify requests appropriately.
+
+You have one main capability:
+
+QUERY DATABASE: You can query the database of captured HTTP requests using SQL SELECT queries.
+   The database has a 'requests' table with these fields:
+   - id: INTEGER (primary key)
+   - method: TEXT (HTTP method: GET, POST, PUT, DELETE, etc.)
+   - url: TEXT (full URL)
+   - status_code: INTEGER (HTTP status code: 200, 404, 500, etc.)
+   - timestamp: TEXT (ISO timestamp, use for ordering - DESC = newest first, ASC = oldest first)
+   - raw_request: TEXT (full request)
+   - raw_response: TEXT (full response)
+   - duration_ms: INTEGER (request duration)
+   - completed_at: TEXT (completion timestamp)
+   - flow_id: TEXT (proxy flow ID)
+
+   When users ask about requests, construct a SQL SELECT query:
+   - Use WHERE for filtering (method = 'GET', url LIKE '%keyword%', status_code = 404)
+   - Use ORDER BY timestamp DESC for newest/recent requests
+   - Use ORDER BY timestamp ASC for oldest/first requests  
+   - Use LIMIT to restrict results (LIMIT 1 for "first", LIMIT 10 for "last 10", etc.)
+   - Combine conditions with AND: WHERE method = 'POST' AND url LIKE '%api%'
+
+   Examples:
+   - User: "GET requests" → SELECT * FROM requests WHERE method = 'GET' ORDER BY timestamp DESC LIMIT 100
+   - User: "first request" → SELECT * FROM requests ORDER BY timestamp ASC LIMIT 1
+   - User: "login requests" → SELECT * FROM requests WHERE url LIKE '%login%' ORDER BY timestamp DESC LIMIT 100
+
+YOUR TASK:
+The user will provide you with text from a resender textbox (an HTTP request). You should:
+1. Analyze the request and understand what the user wants to do with it
+2. Query the database if needed to get context about similar requests
+3. Return a modified version of the HTTP request text that accomplishes what the user wants
+4. Return ONLY the modified HTTP request text, nothing else
+
+The response should be the complete HTTP request string that will replace the text in the textbox."""
+
+# The resender first tries a tool-free call; the model replies with this token
+# instead of an edit when it needs to query the database
+RESENDER_NEED_DB_TOKEN = "<<NEED_DB>>"
+_RESENDER_FAST_SYSTEM_MSG = _RESENDER_SYSTEM_MSG + f"""
+
+The database tool is not available for this first attempt. If you cannot make the edit without looking up captured requests, reply with exactly {RESENDER_NEED_DB_TOKEN} and nothing else."""
+
 def is_ai_configured():
     """Check if AI is configured (OPENAI_API_KEY is set)"""
-    api_key = os.environ.get('OPENAI_API_KEY')
-    return api_key is not None and api_key.strip() != ''
+    return AI_CONFIGURED
 
 
 @agent_bp.route('/status', methods=['GET'])
@@ -83,7 +312,7 @@ def create_chat():
 
 @agent_bp.route('/chats/<int:chat_id>', methods=['GET'])
 def get_chat(chat_id):
-    """Get a specific chat with its messages"""
+    """Get a specific chat with its messages (only those after ?since=<message id>, if given)"""
     try:
         project_id = state.get_current_project()
         if not project_id:
@@ -93,7 +322,8 @@ def get_chat(chat_id):
         if not chat:
             return jsonify({'error': 'Chat not found'}), 404
         
-        messages = db.get_agent_messages(project_id, chat_id)
+        since_id = request.args.get('since', type=int)
+        messages = db.get_agent_messages(project_id, chat_id, since_id=since_id)
         return jsonify({'chat': chat, 'messages': messages}), 200
     except Exception as e:
         logger.error(f"Error getting chat: {e}", exc_info=True)
@@ -109,6 +339,8 @@ def delete_chat(chat_id):
             return jsonify({'error': 'No current project selected'}), 400
         
         success = db.delete_agent_chat(project_id, chat_id)
+        with _chat_history_lock:
+            _chat_history_cache.pop((project_id, chat_id), None)
         if not success:
             return jsonify({'error': 'Chat not found'}), 404
         
@@ -120,7 +352,7 @@ def delete_chat(chat_id):
 
 @agent_bp.route('/chat', methods=['POST'])
 def chat_with_agent():
-    """Chat with the agent using OpenAI Completions API - processes synchronously and updates DB"""
+    """Chat with the agent using OpenAI Completions API - processes synchronously and updates DB (streams SSE if requested)"""
     try:
         # Check if AI is configured
         if not is_ai_configured():
@@ -130,7 +362,7 @@ def chat_with_agent():
         if not data:
             return jsonify({'error': 'Request body is required'}), 400
         
-        message = data.get('message', '')
+        message = data.get('message', '').strip()
         if not message:
             return jsonify({'error': 'message is required'}), 400
         
@@ -141,247 +373,428 @@ def chat_with_agent():
         if not project_id:
             return jsonify({'error': 'No current project selected'}), 400
         
-        # Create new chat if chat_id not provided
         if not chat_id:
-            chat_id = db.create_agent_chat(project_id, message[:50] if len(message) > 50 else message)
-        
-        # Save user message to database
-        db.add_agent_message(project_id, chat_id, 'user', message)
+            # Create new chat and save the user message in one transaction
+            chat_id = db.create_chat_with_message(
+                project_id, message[:50] if len(message) > 50 else message, 'user', message
+            )
+            history = [{'role': 'user', 'content': message}]
+            _cache_chat_history(project_id, chat_id, history)
+        else:
+            # Ignore an accidental resubmit of the message the agent is still working on
+            history = _get_chat_history(project_id, chat_id)
+            if _is_duplicate_submit(project_id, chat_id, history, message):
+                return jsonify({'chat_id': chat_id, 'dedup': True}), 200
+            
+            # Save user message to database
+            _add_chat_message(project_id, chat_id, 'user', message)
+            history.append({'role': 'user', 'content': message})
         
-        # Get conversation history from database
-        db_messages = db.get_agent_messages(project_id, chat_id)
         messages = []
         
         # Add system message
-        system_message = """You are a helpful DAST tool for cybersecurity professionals that can query a database of HTTP requests using SQL, send HTTP requests, and browse the web.
-
-You have three main capabilities:
-
-1. QUERY DATABASE: You can query the database of captured HTTP requests using SQL SELECT queries.
-   The database has a 'requests' table with these fields:
-   - id: INTEGER (primary key)
-   - method: TEXT (HTTP method: GET, POST, PUT, DELETE, etc.)
-   - url: TEXT (full URL)
-   - status_code: INTEGER (HTTP status code: 200, 404, 500, etc.)
-   - timestamp: TEXT (ISO timestamp, use for ordering - DESC = newest first, ASC = oldest first)
-   - raw_request: TEXT (full request)
-   - raw_response: TEXT (full response)
-   - duration_ms: INTEGER (request duration)
-   - completed_at: TEXT (completion timestamp)
-   - flow_id: TEXT (proxy flow ID)
-
-   When users ask about requests, construct a SQL SELECT query:
-   - Use WHERE for filtering (method = 'GET', url LIKE '%keyword%', status_code = 404)
-   - Use ORDER BY timestamp DESC for newest/recent requests
-   - Use ORDER BY timestamp ASC for oldest/first requests  
-   - Use LIMIT to restrict results (LIMIT 1 for "first", LIMIT 10 for "last 10", etc.)
-   - Combine conditions with AND: WHERE method = 'POST' AND url LIKE '%api%'
-
-   Examples:
-   - User: "GET requests" → SELECT * FROM requests WHERE method = 'GET' ORDER BY timestamp DESC LIMIT 100
-   - User: "first request" → SELECT * FROM requests ORDER BY timestamp ASC LIMIT 1
-   - User: "login requests" → SELECT * FROM requests WHERE url LIKE '%login%' ORDER BY timestamp DESC LIMIT 100
-
-2. SEND REQUESTS: You can send HTTP requests to any host, similar to the resender functionality.
-   Use this when users ask you to:
-   - Send a request
-   - Test an endpoint
-   - Resend a modified request
-   - Make a new API call
-   
-   To send a request, provide the raw_request string with the full HTTP request including:
-   - Request line: METHOD PATH HTTP/VERSION
-   - Headers (Host, Content-Type, etc.)
-   - Optional body (for POST/PUT/PATCH)
-   
-   Example raw_request:
-   ```
-   POST /api/users HTTP/1.1
-   Host: api.example.com
-   Content-Type: application/json
-   
-   {"name": "John", "email": "john@example.com"}
-   ```
-   
-   You can also specify host, port, and use_https to control where the request is sent.
-
-3. BROWSE: You can control an automated browser to navigate websites, interact with pages, and perform browsing tasks.
-   Use this when users ask you to:
-   - Browse a website
-   - Search for something
-   - Navigate to a URL
-   - Interact with web pages (click buttons, fill forms, etc.)
-   - Perform web-based security testing
-   
-   The browser automatically uses a proxy to capture all HTTP requests and responses, which are then stored in the database.
-   
-   Examples:
-   - User says "browse to example.com" → use browse with task "navigate to https://example.com"
-   - User says "search for dogs" → use browse with task "search for dogs"
-   - User says "go to login page and fill the form" → use browse with task "go to the login page and fill out the form"
-   
-   You can optionally provide additional_tasks to execute multiple steps sequentially.
-
-AFTER YOU BROWSE, THE PACKETS WILL BE STORED IN THE DATABASE. YOU CAN QUERY THE DATABASE TO GET THE PACKETS.
-After executing queries, sending requests, or browsing, analyze results and provide clear summaries."""
-        
         messages.append({
             'role': 'system',
-            'content': system_message
+            'content': _CHAT_SYSTEM_MSG
         })
         
         # Add conversation history (only user and assistant messages, skip tool messages)
-        for msg in db_messages:
-            if msg['role'] in ['user', 'assistant']:
-                messages.append({
-                    'role': msg['role'],
-                    'content': msg['content']
-                })
+        messages.extend(_compact_chat_history(project_id, chat_id, history))
+        
+        # Stream progress as server-sent events if the client asks for it
+        stream = data.get('stream') or 'text/event-stream' in request.headers.get('Accept', '')
+        events = _run_agent_chat(project_id, chat_id, messages)
+        if stream:
+            return Response(
+                stream_with_context(_sse_events(events)),
+                mimetype='text/event-stream',
+                headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+            )
         
-        client = get_openai_client()
+        # Or return right away and let the client poll the chat for progress
+        if data.get('background'):
+            _agent_executor.submit(_run_agent_chat_in_background, project_id, chat_id, events)
+            return jsonify({'chat_id': chat_id, 'pending': True}), 202
+        
+        for event in events:
+            # Browsing can take minutes - finish the turn in the background
+            # instead of holding this request, the client polls for the rest
+            # (pending tells it to keep polling until the assistant's final message)
+            if event['type'] == 'step' and event['tool_name'] in BACKGROUND_TOOLS:
+                _agent_executor.submit(_run_agent_chat_in_background, project_id, chat_id, events)
+                return jsonify({'chat_id': chat_id, 'pending': True}), 202
+        
+        # Return chat_id
+        return jsonify({'chat_id': chat_id}), 200
         
-        # Define the tools (Completions API format)
-        tools = [
-            get_query_database_tool(),
-            get_send_request_tool(),
-            get_browse_tool()
+    except ValueError as e:
+        logger.error(f"Configuration error: {e}")
+        return jsonify({'error': str(e)}), 500
+    except Exception as e:
+        logger.error(f"Error in agent chat: {e}", exc_info=True)
+        return jsonify({'error': str(e)}), 500
+
+
+def _get_chat_history(project_id, chat_id):
+    """Get the user and assistant messages of a chat, loading them from the DB on a cache miss"""
+    key = (project_id, chat_id)
+    with _chat_history_lock:
+        history = _chat_history_cache.get(key)
+        if history is not None:
+            _chat_history_cache.move_to_end(key)
+            return list(history)
+    
+    history = [
+        {'role': msg['role'], 'content': msg['content']}
+        for msg in db.get_agent_messages(project_id, chat_id)
+        if msg['role'] in ('user', 'assistant')
+    ]
+    _cache_chat_history(project_id, chat_id, history)
+    return list(history)
+
+
+def _cache_chat_history(project_id, chat_id, history):
+    """Cache a chat's history unless another request cached (and extended) it meanwhile"""
+    key = (project_id, chat_id)
+    with _chat_history_lock:
+        if key not in _chat_history_cache:
+            _chat_history_cache[key] = list(history)
+            if len(_chat_history_cache) > CHAT_HISTORY_CACHE_SIZE:
+                _chat_history_cache.popitem(last=False)
+
+
+def _compact_chat_history(project_id, chat_id, history):
+    """Replace the older messages of a long chat with its stored summary, summarizing more when it falls behind"""
+    if len(history) <= CHAT_SUMMARY_THRESHOLD:
+        return history
+    
+    summary, summary_count = db.get_agent_chat_summary(project_id, chat_id)
+    if len(history) - summary_count > CHAT_SUMMARY_THRESHOLD:
+        new_count = len(history) - CHAT_RECENT_MESSAGES
+        try:
+            summary = _summarize_messages(summary, history[summary_count:new_count])
+            summary_count = new_count
+            db.set_agent_chat_summary(project_id, chat_id, summary, summary_count)
+        except Exception as e:
+            # Fall back to whatever summary we already have (or the full history)
+            logger.error(f"Error summarizing chat history: {e}", exc_info=True)
+    
+    if not summary:
+        return history
+    return [
+        {'role': 'assistant', 'content': f"[Prior conversation summary]\n{summary}"},
+        *history[summary_count:]
+    ]
+
+
+def _summarize_messages(previous_summary, messages):
+    """Summarize chat messages (and the previous summary, if any) with the summary model"""
+    transcript = "\n\n".join(f"{msg['role'].capitalize()}: {msg['content']}" for msg in messages)
+    if previous_summary:
+        transcript = f"Previous summary:\n{previous_summary}\n\nNew messages:\n{transcript}"
+    
+    response = get_openai_client().chat.completions.create(
+        model=SUMMARY_MODEL,
+        messages=[
+            {'role': 'system', 'content': _SUMMARY_SYSTEM_MSG},
+            {'role': 'user', 'content': transcript}
+        ],
+    )
+    return response.choices[0].message.content or previous_summary
+
+
+def _is_duplicate_submit(project_id, chat_id, history, message):
+    """Check if a message repeats the last user message of a chat whose turn is still running"""
+    if not history or history[-1] != {'role': 'user', 'content': message}:
+        return False
+    with _chat_history_lock:
+        return (project_id, chat_id) in _active_chats
+
+
+def _add_chat_message(project_id, chat_id, role, content):
+    """Save a user or assistant message and append it to the cached chat history"""
+    db.add_agent_message(project_id, chat_id, role, content)
+    with _chat_history_lock:
+        history = _chat_history_cache.get((project_id, chat_id))
+        if history is not None:
+            history.append({'role': role, 'content': content})
+
+
+def _create_completion(client, model, messages, tools):
+    """Request a chat completion and return the assistant message as a dict"""
+    response = client.chat.completions.create(
+        model=model,
+        messages=messages,
+        tools=tools,
+        tool_choice="auto",
+    )
+    # Get the assistant's message from the response
+    assistant_message = response.choices[0].message
+    
+    # Build assistant message dict for messages list
+    assistant_msg_dict = {
+        'role': 'assistant',
+        'content': assistant_message.content
+    }
+    # Include tool_calls if present
+    tool_calls = assistant_message.tool_calls
+    if tool_calls:
+        assistant_msg_dict['tool_calls'] = [
+            {
+                'id': tc.id,
+                'type': tc.type,
+                'function': {
+                    'name': tc.function.name,
+                    'arguments': tc.function.arguments
+                }
+            }
+            for tc in tool_calls
         ]
+    return assistant_msg_dict
+
+
+def _stream_completion(client, model, messages, tools, on_tool_call=None, cache_key=None):
+    """Stream a chat completion, yielding content delta events and returning the assistant message as a dict.
+    
+    on_tool_call, if given, is called with each tool call dict as soon as the model has finished writing it.
+    cache_key routes requests sharing a message prefix to the same server-side prompt cache.
+    """
+    kwargs = {'prompt_cache_key': cache_key} if cache_key else {}
+    response = client.chat.completions.create(
+        model=model,
+        messages=messages,
+        tools=tools,
+        tool_choice="auto",
+        stream=True,
+        **kwargs
+    )
+    content_parts = []
+    tool_calls = {}  # index -> tool call dict, merged from piecewise deltas
+    current_index = None  # tool calls are streamed one after another, by index
+    finished = set()
+    for chunk in response:
+        if not chunk.choices:
+            continue
+        delta = chunk.choices[0].delta
+        if delta.content:
+            content_parts.append(delta.content)
+            yield {'type': 'delta', 'content': delta.content}
+        for tc in delta.tool_calls or []:
+            if tc.index != current_index:
+                # The previous call is complete once the next one starts
+                if on_tool_call and current_index is not None and current_index not in finished:
+                    finished.add(current_index)
+                    on_tool_call(tool_calls[current_index])
+                current_index = tc.index
+            call = tool_calls.setdefault(tc.index, {
+                'id': None,
+                'type': 'function',
+                'function': {'name': '', 'arguments': ''}
+            })
+            if tc.id:
+                call['id'] = tc.id
+            if tc.function:
+                if tc.function.name:
+                    call['function']['name'] += tc.function.name
+                if tc.function.arguments:
+                    call['function']['arguments'] += tc.function.arguments
+    if on_tool_call and current_index is not None and current_index not in finished:
+        on_tool_call(tool_calls[current_index])
+    
+    assistant_msg_dict = {
+        'role': 'assistant',
+        'content': ''.join(content_parts) or None
+    }
+    if tool_calls:
+        assistant_msg_dict['tool_calls'] = [tool_calls[index] for index in sorted(tool_calls)]
+    return assistant_msg_dict
+
+
+def _run_agent_chat(project_id, chat_id, messages):
+    """Run the agent loop for a chat, yielding progress events and saving messages to the DB"""
+    # Mark the chat as busy so duplicate submits of the same message are ignored meanwhile
+    key = (project_id, chat_id)
+    with _chat_history_lock:
+        _active_chats.add(key)
+    try:
+        client = get_openai_client()
+        yield {'type': 'chat', 'chat_id': chat_id}
         
+        # Resolve the project database once for every query_database call of this turn
+        project = db.get_project_by_id(project_id)
+        db_path = db.get_project_db_path(project['name']) if project else None
+    
         max_iterations = 10  # Safety limit
-        iteration = 0
         
+        # Every iteration only appends to messages, so each request repeats the previous
+        # one as a prefix; a per-chat cache key lets the API reuse that cached prefix
+        cache_key = f"moxy-chat-{project_id}-{chat_id}"
+    
         # Loop until done
-        while iteration < max_iterations:
-            iteration += 1
-            
-            # Call OpenAI Completions API with model from environment variable
-            model = os.environ.get("MODEL", "gpt-5-mini")
-            response = client.chat.completions.create(
-                model=model,
-                messages=messages,
-                tools=tools,
-                tool_choice="auto",
+        for _ in range(max_iterations):
+        
+            # Stream the completion from the configured model, starting each tool as soon as
+            # the model has finished writing its call so tools overlap with generation
+            started_tools = {}  # tool_call id -> future
+            def start_tool(tool_call):
+                if tool_call['id']:
+                    started_tools[tool_call['id']] = _tool_executor.submit(
+                        _execute_tool,
+                        tool_call['function']['name'],
+                        _parse_tool_args(tool_call['function']['arguments']),
+                        _TOOL_DISPATCH,
+                        db_path
+                    )
+            assistant_msg_dict = yield from _stream_completion(
+                client, MODEL, messages, _CHAT_TOOLS, start_tool, cache_key=cache_key
             )
-            # Get the assistant's message from the response
-            assistant_message = response.choices[0].message
-            
-            # Build assistant message dict for messages list
-            assistant_msg_dict = {
-                'role': 'assistant',
-                'content': assistant_message.content
-            }
-            # Include tool_calls if present
-            if assistant_message.tool_calls:
-                assistant_msg_dict['tool_calls'] = [
-                    {
-                        'id': tc.id,
-                        'type': tc.type,
-                        'function': {
-                            'name': tc.function.name,
-                            'arguments': tc.function.arguments
-                        }
-                    }
-                    for tc in assistant_message.tool_calls
-                ]
-            
+        
             # Add assistant message to messages list
             messages.append(assistant_msg_dict)
-            
+        
             # Check for tool calls
-            tool_calls = assistant_message.tool_calls if assistant_message.tool_calls else []
-            
+            tool_calls = assistant_msg_dict.get('tool_calls', [])
+        
             if not tool_calls:
                 # No more tool calls, extract final text content
-                final_content = assistant_message.content or ""
+                final_content = assistant_msg_dict['content'] or ""
                 if final_content:
                     # Save assistant message to database
-                    db.add_agent_message(project_id, chat_id, 'assistant', final_content)
+                    _add_chat_message(project_id, chat_id, 'assistant', final_content)
                 break  # Done, exit loop
-            
-            # Process tool calls
+        
+            # Parse every tool call and record them as steps
+            parsed_calls = []
+            step_rows = []
             for tool_call in tool_calls:
-                tool_name = tool_call.function.name
-                tool_args_str = tool_call.function.arguments
-                try:
-                    tool_args = json.loads(tool_args_str) if isinstance(tool_args_str, str) else tool_args_str
-                except:
-                    tool_args = {}
-                
-                # Save tool_call to database
-                step_description = {
-                    "query_database": "Querying database",
-                    "send_request": "Sending HTTP request",
-                    "browse": "Browsing the web"
-                }.get(tool_name, tool_name)
-                
-                db.add_agent_message(
-                    project_id, chat_id, 'step', 
-                    step_description,
-                    step_type='tool_call',
-                    tool_name=tool_name,
-                    tool_input=tool_args
-                )
-                
-                # Execute the tool
-                if tool_name == "query_database":
-                    sql_query = tool_args.get('sql_query', '')
-                    tool_output = query_database(sql_query)
-                elif tool_name == "send_request":
-                    raw_request = tool_args.get('raw_request', '')
-                    host = tool_args.get('host', 'example.com')
-                    port = tool_args.get('port', '443')
-                    use_https = tool_args.get('use_https')
-                    tool_output = send_request(raw_request, host, port, use_https)
-                elif tool_name == "browse":
-                    task = tool_args.get('task', '')
-                    additional_tasks = tool_args.get('additional_tasks', None)
-                    tool_output = browse(task, additional_tasks)
-                else:
-                    tool_output = {"error": f"Unknown tool: {tool_name}"}
-                
-                # Save tool_result to database
-                result_description = ""
-                if tool_name == "query_database":
-                    result_description = f"Found {tool_output.get('count', 0)} requests"
-                elif tool_name == "send_request":
-                    status_code = tool_output.get('status_code', 0)
-                    if tool_output.get('error'):
-                        result_description = f"Request failed: {tool_output.get('error')}"
-                    else:
-                        result_description = f"Received response: {status_code}"
-                elif tool_name == "browse":
-                    if tool_output.get('status') == 'error':
-                        result_description = f"Browse failed: {tool_output.get('error', 'Unknown error')}"
-                    else:
-                        result_description = tool_output.get('message', 'Browse completed')
-                else:
-                    result_description = f"Tool completed"
-                
-                db.add_agent_message(
-                    project_id, chat_id, 'step',
-                    result_description,
-                    step_type='tool_result',
-                    tool_name=tool_name,
-                    tool_input=tool_args,
-                    tool_output=tool_output
-                )
-                
+                tool_name = tool_call['function']['name']
+                tool_args = _parse_tool_args(tool_call['function']['arguments'])
+                parsed_calls.append((tool_call, tool_name, tool_args))
+            
+                step_description = _STEP_DESCRIPTIONS.get(tool_name, tool_name)
+                step_rows.append(('step', step_description, 'tool_call', tool_name, tool_args, None))
+        
+            # Save the tool_call steps to database in one transaction
+            db.add_agent_messages_bulk(project_id, chat_id, step_rows)
+            for _, step_description, step_type, tool_name, _, _ in step_rows:
+                yield {'type': 'step', 'step_type': step_type, 'tool_name': tool_name, 'content': step_description}
+        
+            # Collect the tool outputs, running any call that wasn't started while streaming
+            futures = [
+                started_tools.get(tool_call['id'])
+                or _tool_executor.submit(_execute_tool, tool_name, tool_args, _TOOL_DISPATCH, db_path)
+                for tool_call, tool_name, tool_args in parsed_calls
+            ]
+            tool_outputs = [future.result() for future in futures]
+        
+            # Record results in the original tool_call order
+            result_rows = []
+            for (tool_call, tool_name, tool_args), tool_output in zip(parsed_calls, tool_outputs):
+                result_description = _format_result(tool_name, tool_output)
+                result_rows.append(('step', result_description, 'tool_result', tool_name, tool_args, tool_output))
+            
                 # Add tool result to messages list (Completions API format)
                 messages.append({
                     "role": "tool",
-                    "tool_call_id": tool_call.id,
-                    "content": json.dumps(tool_output)
+                    "tool_call_id": tool_call['id'],
+                    "content": _dumps_tool_output(_compact_tool_output(tool_output))
                 })
-        
-        # Return chat_id
-        return jsonify({'chat_id': chat_id}), 200
-        
-    except ValueError as e:
-        logger.error(f"Configuration error: {e}")
-        return jsonify({'error': str(e)}), 500
+
+            # Save the tool_result steps to database in one transaction
+            db.add_agent_messages_bulk(project_id, chat_id, result_rows)
+            for _, result_description, step_type, tool_name, _, _ in result_rows:
+                yield {'type': 'step', 'step_type': step_type, 'tool_name': tool_name, 'content': result_description}
+    finally:
+        with _chat_history_lock:
+            _active_chats.discard(key)
+
+
+def _compact_tool_output(value):
+    """Truncate long strings anywhere in a tool result before it is sent to the model"""
+    if isinstance(value, str):
+        if len(value) > TOOL_OUTPUT_MAX_CHARS:
+            return f"{value[:TOOL_OUTPUT_MAX_CHARS]}...[truncated, {len(value)} chars]"
+        return value
+    if isinstance(value, dict):
+        return {key: _compact_tool_output(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_compact_tool_output(item) for item in value]
+    return value
+
+
+def _parse_tool_args(tool_args_str):
+    """Parse the JSON arguments of a tool call, falling back to no arguments if they are malformed"""
+    if not tool_args_str:
+        return {}
+    try:
+        tool_args = json.loads(tool_args_str)
+    except (ValueError, TypeError) as e:
+        logger.warning(f"Invalid tool arguments {tool_args_str!r}: {e}")
+        return {}
+    return tool_args if isinstance(tool_args, dict) else {}
+
+
+def _format_result(tool_name, tool_output):
+    """Describe a tool result for the chat's step log"""
+    describe = _RESULT_DESCRIPTIONS.get(tool_name)
+    return describe(tool_output) if describe else "Tool completed"
+
+
+def _execute_tool(tool_name, tool_args, dispatch, db_path=None):
+    """Run one of the tools in a dispatch table and return its output"""
+    handler = dispatch.get(tool_name)
+    if handler is None:
+        return {"error": f"Unknown tool: {tool_name}"}
+    return handler(tool_args, db_path)
+
+
+def _execute_tools(calls, dispatch, db_path=None):
+    """Run (tool_name, tool_args) calls, concurrently when there are several, returning outputs in order"""
+    if len(calls) == 1:
+        return [_execute_tool(calls[0][0], calls[0][1], dispatch, db_path)]
+    futures = [
+        _tool_executor.submit(_execute_tool, tool_name, tool_args, dispatch, db_path)
+        for tool_name, tool_args in calls
+    ]
+    return [future.result() for future in futures]
+
+
+def _run_agent_chat_in_background(project_id, chat_id, events):
+    """Drain an agent chat off the request thread, recording failures in the chat"""
+    try:
+        for _ in events:
+            pass
     except Exception as e:
-        logger.error(f"Error in agent chat: {e}", exc_info=True)
-        return jsonify({'error': str(e)}), 500
+        logger.error(f"Error in background agent chat: {e}", exc_info=True)
+        # Pollers stop once the last message is from the assistant
+        _add_chat_message(project_id, chat_id, 'assistant', f"Error: {e}")
+
+
+def _sse_events(events):
+    """Format agent events as server-sent events, batching text deltas"""
+    batch_size = SSE_MIN_BATCH_SIZE
+    pending = []
+    pending_len = 0
+    try:
+        for event in events:
+            if event['type'] == 'delta':
+                pending.append(event['content'])
+                pending_len += len(event['content'])
+                if pending_len < batch_size:
+                    continue
+                event = {'type': 'delta', 'content': ''.join(pending)}
+                batch_size = min(batch_size * SSE_BATCH_GROWTH, SSE_MAX_BATCH_SIZE)
+            elif pending:
+                yield f"data: {json.dumps({'type': 'delta', 'content': ''.join(pending)})}\n\n"
+            pending = []
+            pending_len = 0
+            yield f"data: {json.dumps(event)}\n\n"
+        if pending:
+            yield f"data: {json.dumps({'type': 'delta', 'content': ''.join(pending)})}\n\n"
+        yield f"data: {json.dumps({'type': 'done'})}\n\n"
+    except Exception as e:
+        logger.error(f"Error in agent chat stream: {e}", exc_info=True)
+        yield f"data: {json.dumps({'type': 'error', 'error': str(e)})}\n\n"
 
 
 @agent_bp.route('/resender_agent', methods=['POST'])
@@ -406,49 +819,33 @@ def resender_agent():
         
         client = get_openai_client()
         
-        # System message for resender agent - focused on editing HTTP requests with database context
-        system_message = """You are an AI copilot for editing HTTP requests in a resender tool. You can query a database of HTTP requests using SQL to help you understand the context and modify requests appropriately.
-
-You have one main capability:
-
-QUERY DATABASE: You can query the database of captured HTTP requests using SQL SELECT queries.
-   The database has a 'requests' table with these fields:
-   - id: INTEGER (primary key)
-   - method: TEXT (HTTP method: GET, POST, PUT, DELETE, etc.)
-   - url: TEXT (full URL)
-   - status_code: INTEGER (HTTP status code: 200, 404, 500, etc.)
-   - timestamp: TEXT (ISO timestamp, use for ordering - DESC = newest first, ASC = oldest first)
-   - raw_request: TEXT (full request)
-   - raw_response: TEXT (full response)
-   - duration_ms: INTEGER (request duration)
-   - completed_at: TEXT (completion timestamp)
-   - flow_id: TEXT (proxy flow ID)
-
-   When users ask about requests, construct a SQL SELECT query:
-   - Use WHERE for filtering (method = 'GET', url LIKE '%keyword%', status_code = 404)
-   - Use ORDER BY timestamp DESC for newest/recent requests
-   - Use ORDER BY timestamp ASC for oldest/first requests  
-   - Use LIMIT to restrict results (LIMIT 1 for "first", LIMIT 10 for "last 10", etc.)
-   - Combine conditions with AND: WHERE method = 'POST' AND url LIKE '%api%'
-
-   Examples:
-   - User: "GET requests" → SELECT * FROM requests WHERE method = 'GET' ORDER BY timestamp DESC LIMIT 100
-   - User: "first request" → SELECT * FROM requests ORDER BY timestamp ASC LIMIT 1
-   - User: "login requests" → SELECT * FROM requests WHERE url LIKE '%login%' ORDER BY timestamp DESC LIMIT 100
-
-YOUR TASK:
-The user will provide you with text from a resender textbox (an HTTP request). You should:
-1. Analyze the request and understand what the user wants to do with it
-2. Query the database if needed to get context about similar requests
-3. Return a modified version of the HTTP request text that accomplishes what the user wants
-4. Return ONLY the modified HTTP request text, nothing else
-
-The response should be the complete HTTP request string that will replace the text in the textbox."""
+        # Fast path: most edits need no database context, so first ask for the edit
+        # without tools and only run the tool loop if the model says it needs the DB
+        response = client.chat.completions.create(
+            model=MODEL,
+            messages=[
+                {
+                    'role': 'system',
+                    'content': _RESENDER_FAST_SYSTEM_MSG
+                },
+                {
+                    'role': 'user',
+                    'content': text
+                }
+            ],
+        )
+        fast_content = response.choices[0].message.content or ""
+        if fast_content.strip() and RESENDER_NEED_DB_TOKEN not in fast_content:
+            return jsonify({'text': fast_content}), 200
+        
+        # Resolve the project database once for every query_database call below
+        project = db.get_project_by_id(project_id)
+        db_path = db.get_project_db_path(project['name']) if project else None
         
         messages = [
             {
                 'role': 'system',
-                'content': system_message
+                'content': _RESENDER_SYSTEM_MSG
             },
             {
                 'role': 'user',
@@ -456,84 +853,43 @@ The response should be the complete HTTP request string that will replace the te
             }
         ]
         
-        # Define only the query_database tool (no send_request or browse)
-        tools = [
-            get_query_database_tool()
-        ]
-        
         max_iterations = 10  # Safety limit
-        iteration = 0
         
         # Loop until done
-        while iteration < max_iterations:
-            iteration += 1
-            
-            # Call OpenAI Completions API with model from environment variable
-            model = os.environ.get("MODEL", "gpt-5-mini")
-            response = client.chat.completions.create(
-                model=model,
-                messages=messages,
-                tools=tools,
-                tool_choice="auto",
-            )
-            
-            # Get the assistant's message from the response
-            assistant_message = response.choices[0].message
-            
-            # Build assistant message dict for messages list
-            assistant_msg_dict = {
-                'role': 'assistant',
-                'content': assistant_message.content
-            }
-            # Include tool_calls if present
-            if assistant_message.tool_calls:
-                assistant_msg_dict['tool_calls'] = [
-                    {
-                        'id': tc.id,
-                        'type': tc.type,
-                        'function': {
-                            'name': tc.function.name,
-                            'arguments': tc.function.arguments
-                        }
-                    }
-                    for tc in assistant_message.tool_calls
-                ]
+        for _ in range(max_iterations):
+            # Call OpenAI Completions API with the configured model
+            assistant_msg_dict = _create_completion(client, MODEL, messages, _RESENDER_TOOLS)
             
             # Add assistant message to messages list
             messages.append(assistant_msg_dict)
             
             # Check for tool calls
-            tool_calls = assistant_message.tool_calls if assistant_message.tool_calls else []
+            tool_calls = assistant_msg_dict.get('tool_calls', [])
             
             if not tool_calls:
                 # No more tool calls, extract final text content
-                final_content = assistant_message.content or ""
+                final_content = assistant_msg_dict['content'] or ""
                 if final_content:
                     # Return the modified text
                     return jsonify({'text': final_content}), 200
                 break  # Done, exit loop
             
-            # Process tool calls
-            for tool_call in tool_calls:
-                tool_name = tool_call.function.name
-                tool_args_str = tool_call.function.arguments
-                try:
-                    tool_args = json.loads(tool_args_str) if isinstance(tool_args_str, str) else tool_args_str
-                except:
-                    tool_args = {}
-                
-                # Execute the tool (only query_database is available)
-                if tool_name == "query_database":
-                    sql_query = tool_args.get('sql_query', '')
-                    tool_output = query_database(sql_query)
-                else:
-                    tool_output = {"error": f"Unknown tool: {tool_name}"}
-                
+            # Execute the tools (only query_database is available), concurrently when there are several
+            tool_outputs = _execute_tools(
+                [
+                    (tool_call['function']['name'], _parse_tool_args(tool_call['function']['arguments']))
+                    for tool_call in tool_calls
+                ],
+                _RESENDER_TOOL_DISPATCH,
+                db_path
+            )
+            
+            for tool_call, tool_output in zip(tool_calls, tool_outputs):
                 # Add tool result to messages list (Completions API format)
                 messages.append({
                     "role": "tool",
-                    "tool_call_id": tool_call.id,
-                    "content": json.dumps(tool_output)
+                    "tool_call_id": tool_call['id'],
+                    "content": _dumps_tool_output(_compact_tool_output(tool_output))
                 })
         
         # If we get here, return the last assistant message content
@@ -1,4 +1,4 @@
-from flask import Blueprint, request, jsonify, send_file
+from flask import Blueprint, Response, request, jsonify, send_file
 from .. import db, state, proxy_manager
 import os
 import subprocess
@@ -6,6 +6,17 @@ import platform
 
 projects_bp = Blueprint('projects', __name__)
 
+# Command that opens a folder in the file manager, per operating system
+FOLDER_OPENERS = {
+    'Darwin': 'open',
+    'Windows': 'explorer',
+    'Linux': 'xdg-open',
+}
+
+# Behind nginx, database exports can be handed off to an internal location that maps
+# to projects_data (e.g. /protected-projects/), so nginx sends the file instead of Flask
+EXPORT_ACCEL_REDIRECT_PREFIX = os.environ.get('X_ACCEL_REDIRECT_PREFIX')
+
 
 @projects_bp.route('/current', methods=['GET'])
 def get_current_project():
@@ -61,10 +72,17 @@ def set_current_project():
 
 @projects_bp.route('', methods=['GET'])
 def get_projects():
-    """Get all projects"""
+    """Get all projects (304 if unchanged since the client's ETag)"""
     try:
-        projects = db.get_all_projects()
-        return jsonify(projects), 200
+        etag = '-'.join(str(part) for part in db.get_projects_version())
+        if request.if_none_match.contains(etag):
+            response = Response(status=304)
+        else:
+            response = jsonify(db.get_all_projects())
+        response.set_etag(etag)
+        # Browsers revalidate on every poll, getting a body only when something changed
+        response.cache_control.no_cache = True
+        return response, response.status_code
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -117,8 +135,8 @@ def update_project(project_id):
         
         data = request.get_json()
         
-        # Check if name already exists for another project
-        if 'name' in data:
+        # Check if name already exists for another project (only when it's changing)
+        if 'name' in data and data['name'] != project['name']:
             existing_project = db.get_project_by_name(data['name'])
             if existing_project and existing_project['id'] != project_id:
                 return jsonify({'error': 'Project with this name already exists'}), 409
@@ -172,21 +190,24 @@ def open_project_folder(project_id):
         
         # Open folder based on operating system
         system = platform.system()
+        opener = FOLDER_OPENERS.get(system)
+        if opener is None:
+            return jsonify({'error': f'Unsupported operating system: {system}'}), 400
         try:
-            if system == 'Darwin':  # macOS
-                subprocess.run(['open', folder_path], check=True)
-            elif system == 'Windows':
-                subprocess.run(['explorer', folder_path], check=True)
-            elif system == 'Linux':
-                subprocess.run(['xdg-open', folder_path], check=True)
-            else:
-                return jsonify({'error': f'Unsupported operating system: {system}'}), 400
+            # Launch the file manager without waiting for it to exit
+            subprocess.Popen(
+                [opener, folder_path],
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                start_new_session=True
+            )
             
             return jsonify({
                 'message': 'Folder opened successfully',
                 'path': folder_path
             }), 200
-        except subprocess.CalledProcessError as e:
+        except OSError as e:
             return jsonify({'error': f'Failed to open folder: {str(e)}'}), 500
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -210,12 +231,26 @@ def export_project_database(project_id):
         sanitized_name = db.sanitize_filename(project['name'])
         download_name = f"{sanitized_name}.db"
         
-        # Send file for download
+        # Fold the write-ahead log into the database file so the download is complete
+        with db.get_db(db_path) as conn:
+            conn.execute('PRAGMA wal_checkpoint(PASSIVE)')
+        
+        if EXPORT_ACCEL_REDIRECT_PREFIX:
+            response = Response(mimetype='application/x-sqlite3')
+            response.headers['X-Accel-Redirect'] = (
+                f"{EXPORT_ACCEL_REDIRECT_PREFIX.rstrip('/')}/{os.path.basename(db_path)}"
+            )
+            response.headers['Content-Disposition'] = f'attachment; filename="{download_name}"'
+            return response
+        
+        # Send file for download - streamed from disk, with Range/If-Modified-Since support
+        # so interrupted downloads resume (or X-Sendfile if USE_X_SENDFILE is set)
         return send_file(
             db_path,
             as_attachment=True,
             download_name=download_name,
-            mimetype='application/x-sqlite3'
+            mimetype='application/x-sqlite3',
+            conditional=True
         )
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -1,21 +1,71 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify
 from .. import db
+import json
 
 requests_bp = Blueprint('requests', __name__)
 
+# Rows encoded per chunk when streaming a request list
+STREAM_BATCH_SIZE = 200
+
+_dumps_row = json.JSONEncoder(separators=(',', ':')).encode
+
+
+def _json_array(rows):
+    """Encode rows as a JSON array chunk by chunk, so large lists are never built in memory"""
+    yield '['
+    batch = []
+    first = True
+    for row in rows:
+        batch.append(_dumps_row(row))
+        if len(batch) >= STREAM_BATCH_SIZE:
+            yield ('' if first else ',') + ','.join(batch)
+            first = False
+            batch = []
+    if batch:
+        yield ('' if first else ',') + ','.join(batch)
+    yield ']'
+
+
+def _request_list_response(project_id, columns=None):
+    """Stream a project's request list (honouring ?limit= and ?since=), or a 304 if it hasn't changed"""
+    # Verify project exists
+    project = db.get_project_by_id(project_id)
+    if not project:
+        return jsonify({'error': 'Project not found'}), 404
+    
+    limit = request.args.get('limit', type=int)  # No default limit
+    since_id = request.args.get('since', type=int)
+    
+    # Polls of an unchanged request list get a 304 instead of the whole list again
+    version = db.get_project_requests_version(project_id)
+    etag = None
+    if version is not None:
+        etag = '-'.join(str(part) for part in (*version, limit, since_id)) + ('-summary' if columns else '')
+    if etag and request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        requests = db.iter_project_requests(project_id, limit, since_id, columns=columns)
+        response = Response(_json_array(requests), mimetype='application/json')
+    if etag:
+        response.set_etag(etag)
+        response.cache_control.no_cache = True
+    return response, response.status_code
+
 
 @requests_bp.route('', methods=['GET'])
 def get_project_requests(project_id):
-    """Get all requests for a specific project"""
+    """Get all requests for a specific project (or only those after ?since=<request id>)"""
     try:
-        # Verify project exists
-        project = db.get_project_by_id(project_id)
-        if not project:
-            return jsonify({'error': 'Project not found'}), 404
-        
-        limit = request.args.get('limit', type=int)  # No default limit
-        requests = db.get_project_requests(project_id, limit)
-        return jsonify(requests), 200
+        return _request_list_response(project_id)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@requests_bp.route('/summary', methods=['GET'])
+def get_project_requests_summary(project_id):
+    """Get all requests for a specific project without their raw request/response"""
+    try:
+        return _request_list_response(project_id, db.REQUEST_SUMMARY_COLUMNS)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -80,13 +130,10 @@ def delete_project_request(project_id, request_id):
         if not project:
             return jsonify({'error': 'Project not found'}), 404
         
-        # Verify request exists
-        req = db.get_project_request(project_id, request_id)
-        if not req:
+        # Delete it, the row count tells whether the request existed
+        if not db.delete_project_request(project_id, request_id):
             return jsonify({'error': 'Request not found'}), 404
         
-        db.delete_project_request(project_id, request_id)
-        
         return jsonify({'message': 'Request deleted successfully'}), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
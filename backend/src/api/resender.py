@@ -3,12 +3,36 @@ API endpoints for resender functionality.
 """
 from flask import Blueprint, request, jsonify
 from .. import db, http_sender
+import concurrent.futures
 import logging
+import re
 
 logger = logging.getLogger(__name__)
 
 resender_bp = Blueprint('resender', __name__)
 
+# Requests sent with background=true run here instead of holding the HTTP request
+RESENDER_BACKGROUND_WORKERS = 32
+_send_executor = concurrent.futures.ThreadPoolExecutor(
+    max_workers=RESENDER_BACKGROUND_WORKERS, thread_name_prefix='resender-send'
+)
+
+# A tab host given with a protocol, e.g. http://hostname or https://hostname:8443
+# (the port, if any, follows the last colon)
+_HOST_URL_RE = re.compile(r'(https?)://(?:(.*):)?(.*)', re.DOTALL)
+
+
+def _parse_tab_host(host, port):
+    """Split a tab's host into (host, port, use_https), honoring an http:// or https:// prefix"""
+    match = _HOST_URL_RE.fullmatch(host)
+    if not match:
+        # No protocol in host, determine from port (default True, unless port is 80)
+        return host, port, port != '80'
+    scheme, hostname, host_port = match.groups()
+    if hostname is None:
+        return host_port, port, scheme == 'https'
+    return hostname, host_port, scheme == 'https'
+
 
 @resender_bp.route('/tabs', methods=['GET'])
 def get_resender_tabs(project_id):
@@ -19,12 +43,18 @@ def get_resender_tabs(project_id):
             return jsonify({'error': 'Project not found'}), 404
         
         tabs = db.get_resender_tabs(project_id)
-        # Get versions for each tab
+        # Get the versions of all tabs in one query
+        versions_by_tab = db.get_resender_versions_by_tab(project_id)
         for tab in tabs:
-            versions = db.get_resender_versions(project_id, tab['id'])
-            tab['versions'] = versions
-        
-        return jsonify(tabs), 200
+            tab['versions'] = versions_by_tab.get(tab['id'], [])
+        
+        # Tabs have no change counter, so the ETag is a hash of the list itself:
+        # an unchanged list is still read but not sent again
+        response = jsonify(tabs)
+        response.add_etag()
+        response.cache_control.no_cache = True
+        response.make_conditional(request)
+        return response, response.status_code
     except Exception as e:
         logger.error(f"Error getting resender tabs: {e}", exc_info=True)
         return jsonify({'error': str(e)}), 500
@@ -43,8 +73,7 @@ def create_resender_tab(project_id):
         host = data.get('host', 'example.com')
         port = data.get('port', '443')
         
-        tab_id = db.create_resender_tab(project_id, name, host, port)
-        tab = db.get_resender_tab(project_id, tab_id)
+        tab = db.create_resender_tab(project_id, name, host, port)
         tab['versions'] = []
         
         return jsonify(tab), 201
@@ -61,13 +90,10 @@ def get_resender_tab(project_id, tab_id):
         if not project:
             return jsonify({'error': 'Project not found'}), 404
         
-        tab = db.get_resender_tab(project_id, tab_id)
+        tab = db.get_resender_tab_with_versions(project_id, tab_id)
         if not tab:
             return jsonify({'error': 'Tab not found'}), 404
         
-        versions = db.get_resender_versions(project_id, tab_id)
-        tab['versions'] = versions
-        
         return jsonify(tab), 200
     except Exception as e:
         logger.error(f"Error getting resender tab: {e}", exc_info=True)
@@ -82,10 +108,6 @@ def update_resender_tab(project_id, tab_id):
         if not project:
             return jsonify({'error': 'Project not found'}), 404
         
-        tab = db.get_resender_tab(project_id, tab_id)
-        if not tab:
-            return jsonify({'error': 'Tab not found'}), 404
-        
         data = request.get_json() or {}
         updated_tab = db.update_resender_tab(
             project_id,
@@ -94,9 +116,8 @@ def update_resender_tab(project_id, tab_id):
             host=data.get('host'),
             port=data.get('port')
         )
-        
-        versions = db.get_resender_versions(project_id, tab_id)
-        updated_tab['versions'] = versions
+        if not updated_tab:
+            return jsonify({'error': 'Tab not found'}), 404
         
         return jsonify(updated_tab), 200
     except Exception as e:
@@ -112,11 +133,10 @@ def delete_resender_tab(project_id, tab_id):
         if not project:
             return jsonify({'error': 'Project not found'}), 404
         
-        tab = db.get_resender_tab(project_id, tab_id)
-        if not tab:
+        # Delete it, the row count tells whether the tab existed
+        if not db.delete_resender_tab(project_id, tab_id):
             return jsonify({'error': 'Tab not found'}), 404
         
-        db.delete_resender_tab(project_id, tab_id)
         return jsonify({'message': 'Tab deleted successfully'}), 200
     except Exception as e:
         logger.error(f"Error deleting resender tab: {e}", exc_info=True)
@@ -146,44 +166,28 @@ def send_resender_request(project_id, tab_id):
         port = tab.get('port', '443')
         
         # Parse host to detect protocol (http:// or https://)
-        # If host starts with http:// or https://, extract protocol and actual hostname
-        use_https = None
-        if host.startswith('http://'):
-            use_https = False
-            # Extract hostname from http://hostname or http://hostname:port
-            host = host[7:]  # Remove 'http://' prefix
-            if ':' in host:
-                # Extract port if present in host (e.g., http://hostname:5001)
-                host_parts = host.rsplit(':', 1)
-                host = host_parts[0]
-                port = host_parts[1]
-        elif host.startswith('https://'):
-            use_https = True
-            # Extract hostname from https://hostname or https://hostname:port
-            host = host[8:]  # Remove 'https://' prefix
-            if ':' in host:
-                # Extract port if present in host (e.g., https://hostname:8443)
-                host_parts = host.rsplit(':', 1)
-                host = host_parts[0]
-                port = host_parts[1]
-        else:
-            # No protocol in host, determine from port (default True, unless port is 80)
-            use_https = port != '80'
+        host, port, use_https = _parse_tab_host(host, port)
+        
+        # Slow targets can be sent in the background - the version is saved right away
+        # without a response, and the client polls it until raw_response is set
+        if data.get('background'):
+            version = db.create_resender_version(project_id, tab_id, raw_request, None)
+            _send_executor.submit(
+                _send_in_background, project_id, tab_id, version['id'], raw_request, host, port, use_https
+            )
+            return jsonify({'version': version, 'pending': True}), 202
         
         # Send the request
         result = http_sender.send_raw_http_request(raw_request, host, port, use_https)
         
         # Save the version to database
-        version_id = db.create_resender_version(
+        version = db.create_resender_version(
             project_id,
             tab_id,
             raw_request,
             result.get('raw_response')
         )
         
-        # Get the created version
-        version = db.get_resender_version(project_id, tab_id, version_id)
-        
         return jsonify({
             'version': version,
             'status_code': result.get('status_code'),
@@ -195,6 +199,35 @@ def send_resender_request(project_id, tab_id):
         return jsonify({'error': str(e)}), 500
 
 
+def _send_in_background(project_id, tab_id, version_id, raw_request, host, port, use_https):
+    """Send a resender request off the request thread and store its response in the version"""
+    try:
+        result = http_sender.send_raw_http_request(raw_request, host, port, use_https)
+        db.update_resender_version(project_id, tab_id, version_id, result.get('raw_response'))
+    except Exception as e:
+        logger.error(f"Error sending resender request in background: {e}", exc_info=True)
+        raw_response = f'HTTP/1.1 500 Send Error\r\nContent-Type: text/plain\r\n\r\n{e}'
+        db.update_resender_version(project_id, tab_id, version_id, raw_response)
+
+
+@resender_bp.route('/tabs/<int:tab_id>/versions/<int:version_id>', methods=['GET'])
+def get_resender_version(project_id, tab_id, version_id):
+    """Get a specific version (e.g. to poll one sent in the background)"""
+    try:
+        project = db.get_project_by_id(project_id)
+        if not project:
+            return jsonify({'error': 'Project not found'}), 404
+        
+        version = db.get_resender_version(project_id, tab_id, version_id)
+        if not version:
+            return jsonify({'error': 'Version not found'}), 404
+        
+        return jsonify(version), 200
+    except Exception as e:
+        logger.error(f"Error getting resender version: {e}", exc_info=True)
+        return jsonify({'error': str(e)}), 500
+
+
 @resender_bp.route('/tabs/<int:tab_id>/versions', methods=['GET'])
 def get_resender_versions(project_id, tab_id):
     """Get all versions for a resender tab"""
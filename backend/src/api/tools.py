@@ -4,13 +4,50 @@ These tools are used by the agent endpoints.
 """
 import os
 import asyncio
+import functools
 import logging
+import re
 import sqlite3
+import threading
+from collections import OrderedDict
 from .. import db, state, http_sender, proxy_manager, browser_manager
-from browser_use import Agent as BrowserAgent, ChatOpenAI, ChatOllama
 
 logger = logging.getLogger(__name__)
 
+# Browse calls run on the browser manager's event loop, so the shared browser
+# session stays bound to a live loop between calls
+BROWSE_TIMEOUT = 600  # seconds
+
+# The browser agent's LLM client, shared by every browse call so its HTTP pool is reused
+_browse_llm = None
+
+# query_database only runs SELECT statements (optionally preceded by comments); the
+# connections are read-only too, and sqlite3 refuses stacked statements on its own
+_SELECT_RE = re.compile(r'\s*(?:(?:/\*.*?\*/|--[^\n]*\n)\s*)*SELECT\b', re.IGNORECASE | re.DOTALL)
+
+# The query shapes the agent is prompted to write, matched so their literals can be
+# bound as parameters and the prepared statement reused across different values
+_QUERY_TEMPLATE_RE = re.compile(
+    r"SELECT\s+\*\s+FROM\s+requests"
+    r"(?:\s+WHERE\s+(method|status_code|url)\s*(=|\s+LIKE\s+)\s*('[^']*'|\d+))?"
+    r"\s+ORDER\s+BY\s+timestamp\s+(ASC|DESC)"
+    r"(?:\s+LIMIT\s+(\d+))?\s*;?",
+    re.IGNORECASE
+)
+
+# query_database returns at most MAX_QUERY_ROWS rows, fetched QUERY_FETCH_SIZE at a time,
+# and caps raw request/response cells at MAX_CELL_BYTES
+MAX_QUERY_ROWS = 500
+QUERY_FETCH_SIZE = 200
+MAX_CELL_BYTES = int(os.environ.get('MAX_CELL_BYTES', 4096))
+RAW_COLUMNS = frozenset({'raw_request', 'raw_response'})
+
+# Results of recent query_database calls that only read the requests table, keyed by
+# (db_path, SQL, parameters) and tagged with the table's requests_version
+QUERY_CACHE_SIZE = 64
+_query_cache = OrderedDict()
+_query_cache_lock = threading.Lock()
+
 
 def get_query_database_tool():
     """Get the query_database tool definition for OpenAI Completions API."""
@@ -176,7 +213,43 @@ Returns status and result message.""",
     }
 
 
-def query_database(sql_query: str) -> dict:
+def _row_to_dict(columns, row):
+    """Convert a result row to a dict, decoding raw HTTP columns (may be stored as bytes) and capping their size"""
+    result = {}
+    for key, value in zip(columns, row):
+        if key in RAW_COLUMNS and isinstance(value, (bytes, str)) and len(value) > MAX_CELL_BYTES:
+            omitted = len(value) - MAX_CELL_BYTES
+            value = value[:MAX_CELL_BYTES]
+            if isinstance(value, bytes):
+                value = value.decode('utf-8', errors='replace')
+            value = f"{value}...<truncated {omitted} bytes>"
+        elif isinstance(value, bytes):
+            value = value.decode('utf-8', errors='replace')
+        result[key] = value
+    return result
+
+
+@functools.lru_cache(maxsize=256)
+def _parameterize_query(sql_query):
+    """Rewrite a query matching one of the common templates into SQL with bound parameters (memoized, the agent repeats queries)"""
+    sql_query = sql_query.strip()
+    match = _QUERY_TEMPLATE_RE.fullmatch(sql_query)
+    if not match:
+        return sql_query, ()
+    column, operator, literal, direction, limit = match.groups()
+    sql = 'SELECT * FROM requests'
+    params = []
+    if column:
+        sql += f' WHERE {column.lower()} {operator.strip().upper()} ?'
+        params.append(literal[1:-1] if literal.startswith("'") else int(literal))
+    sql += f' ORDER BY timestamp {direction.upper()}'
+    if limit:
+        sql += ' LIMIT ?'
+        params.append(int(limit))
+    return sql, tuple(params)
+
+
+def query_database(sql_query: str, db_path: str = None) -> dict:
     """
     Execute a SQL query against the requests database.
     
@@ -200,49 +273,85 @@ def query_database(sql_query: str) -> dict:
     
     Args:
         sql_query: SQL SELECT query to execute (only SELECT queries allowed)
+        db_path: Project database to query (defaults to the current project's)
     
     Returns:
         A dict containing the query results: {"count": int, "requests": [...]}
     """
     try:
-        project_id = state.get_current_project()
-        if not project_id:
-            return {"error": "No current project selected"}
-        
-        project = db.get_project_by_id(project_id)
-        if not project:
-            return {"error": "Project not found"}
-        
-        db_path = db.get_project_db_path(project['name'])
-        if not os.path.exists(db_path):
-            return {"count": 0, "requests": []}
+        if db_path is None:
+            project_id = state.get_current_project()
+            if not project_id:
+                return {"error": "No current project selected"}
+            
+            project = db.get_project_by_id(project_id)
+            if not project:
+                return {"error": "Project not found"}
+            
+            db_path = db.get_project_db_path(project['name'])
         
         # Security: Only allow SELECT queries
-        sql_query_upper = sql_query.strip().upper()
-        if not sql_query_upper.startswith('SELECT'):
+        if not _SELECT_RE.match(sql_query):
             return {"error": "Only SELECT queries are allowed"}
         
-        # Use SQLite to execute query
-        conn = sqlite3.connect(db_path)
-        conn.row_factory = sqlite3.Row
+        # Use a pooled read-only SQLite connection to execute query
+        try:
+            conn, file_id = db.acquire_read_conn(db_path)
+        except FileNotFoundError:
+            return {"count": 0, "requests": []}
         cursor = conn.cursor()
         
         try:
-            cursor.execute(sql_query)
-            rows = cursor.fetchall()
+            # Serve a repeated query from the cache while the requests table is unchanged
+            sql, params = _parameterize_query(sql_query)
+            cache_key = (db_path, sql, params)
+            version = db.get_requests_version(conn, db_path)
+            if version is not None:
+                with _query_cache_lock:
+                    cached = _query_cache.get(cache_key)
+                    if cached and cached[0] == version:
+                        _query_cache.move_to_end(cache_key)
+                        return cached[1]
             
-            # Convert rows to dicts
-            result = [dict(row) for row in rows]
+            # Track which tables the query reads, only requests-only results can be cached
+            tables_read = set()
+            def authorizer(action, arg1, arg2, db_name, trigger_name):
+                if action == sqlite3.SQLITE_READ:
+                    tables_read.add(arg1)
+                return sqlite3.SQLITE_OK
+            conn.set_authorizer(authorizer)
+            try:
+                cursor.execute(sql, params)
+                columns = [column[0] for column in cursor.description or ()]
+                
+                # Fetch in batches up to MAX_QUERY_ROWS, converting rows to dicts as we go
+                result = []
+                while len(result) < MAX_QUERY_ROWS:
+                    batch = cursor.fetchmany(min(QUERY_FETCH_SIZE, MAX_QUERY_ROWS - len(result)))
+                    if not batch:
+                        break
+                    result.extend(_row_to_dict(columns, row) for row in batch)
+                truncated = len(result) >= MAX_QUERY_ROWS and cursor.fetchone() is not None
+            finally:
+                conn.set_authorizer(None)
             
-            return {
+            output = {
                 "count": len(result),
                 "requests": result
             }
+            if truncated:
+                output["truncated"] = f"Only the first {MAX_QUERY_ROWS} rows are returned, use LIMIT/OFFSET or a narrower WHERE"
+            if version is not None and tables_read == {'requests'}:
+                with _query_cache_lock:
+                    _query_cache[cache_key] = (version, output)
+                    if len(_query_cache) > QUERY_CACHE_SIZE:
+                        _query_cache.popitem(last=False)
+            return output
         except sqlite3.Error as e:
             logger.error(f"SQL error: {e}")
             return {"error": f"SQL error: {str(e)}"}
         finally:
-            conn.close()
+            db.release_read_conn(db_path, conn, file_id)
     except Exception as e:
         logger.error(f"Error querying database: {e}", exc_info=True)
         return {"error": str(e)}
@@ -288,6 +397,26 @@ def send_request(raw_request: str, host: str = 'example.com', port: str = '443',
         }
 
 
+def _get_browse_llm():
+    """Get the browser agent's LLM client, creating it on first use (only called on the browse loop)"""
+    global _browse_llm
+    if _browse_llm is None:
+        from browser_use import ChatOpenAI, ChatOllama
+        
+        # Select LLM based on environment variables
+        use_ollama_env = os.environ.get("USE_OLLAMA", "false").lower()
+        use_ollama = use_ollama_env not in ["false", "0", "no"]
+        if use_ollama:
+            _browse_llm = ChatOllama(
+                model=os.environ.get("MODEL")
+            )
+        else:
+            _browse_llm = ChatOpenAI(
+                model=os.environ.get("MODEL", "gpt-5-mini"),
+            )
+    return _browse_llm
+
+
 async def _browse_async(task: str, additional_tasks: list = None) -> dict:
     """
     Async helper function to browse using browser-use Agent.
@@ -305,28 +434,20 @@ async def _browse_async(task: str, additional_tasks: list = None) -> dict:
             logger.info("Proxy not running, starting proxy...")
             if not proxy_manager.start_proxy():
                 return {"status": "error", "error": "Failed to start proxy"}
-            # Wait a bit for proxy to start
-            await asyncio.sleep(2)
+            # Wait for the proxy to listen (off the browse loop, other browse calls keep running)
+            if not await asyncio.to_thread(proxy_manager.wait_for_proxy):
+                return {"status": "error", "error": "Proxy did not start listening"}
         
         # Get or create browser session
         browser = await browser_manager.get_or_create_browser()
         
-        # Select LLM and agent based on environment variables and BROWSER_USE_OPENAI
-        use_ollama_env = os.environ.get("USE_OLLAMA", "false").lower()
-        use_ollama = use_ollama_env not in ["false", "0", "no"]
-        if use_ollama:
-            llm = ChatOllama(
-                model=os.environ.get("MODEL")
-            )
-        else:
-            llm = ChatOpenAI(
-                model=os.environ.get("MODEL", "gpt-5-mini"),
-            )
+        # browser_use is heavy, so it's only imported once something actually browses
+        from browser_use import Agent as BrowserAgent
 
         agent = BrowserAgent(
             task=task,
             browser_session=browser,
-            llm=llm
+            llm=_get_browse_llm()
         )
         
         # Run the initial task
@@ -366,14 +487,13 @@ def browse(task: str, additional_tasks: list = None) -> dict:
         A dict with the result: {"status": "success", "message": str, "error": str (optional)}
     """
     try:
-        # Run async function in new event loop
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
+        # Run async function on the shared browse loop
+        future = asyncio.run_coroutine_threadsafe(_browse_async(task, additional_tasks), browser_manager.get_browser_loop())
         try:
-            result = loop.run_until_complete(_browse_async(task, additional_tasks))
-        finally:
-            loop.close()
-        return result
+            return future.result(timeout=BROWSE_TIMEOUT)
+        except TimeoutError:
+            future.cancel()
+            raise TimeoutError(f"Browsing did not finish within {BROWSE_TIMEOUT} seconds") from None
     except Exception as e:
         logger.error(f"Error running browse: {e}", exc_info=True)
         return {
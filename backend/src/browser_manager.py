@@ -5,61 +5,44 @@ Browser management for browser-use
 import asyncio
 import threading
 import sys
-from browser_use import Browser
-from browser_use.browser import ProxySettings
 from . import proxy_manager
 
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
+# The browser and everything using it (browse calls, the UI's start button) run on one
+# long-lived event loop in a background thread, so the browser stays bound to a live loop
+_browser_loop = None
+_browser_loop_lock = threading.Lock()
+
 # Global browser instance
 _browser_instance = None
-_browser_lock = threading.Lock()
+# Shared by every coroutine on the browser loop, so this must not block it
+_browser_lock = asyncio.Lock()
 
 
-def _run_browser(proxy_port):
-    """Run the browser in a separate thread with its own event loop"""
-    global _browser_instance
-    
-    # Create a new event loop for this thread
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-    
-    async def start_browser():
-        global _browser_instance
-        try:
-            # Configure browser to use mitmproxy
-            proxy = ProxySettings(
-                server=f"http://127.0.0.1:{proxy_port}",  # mitmproxy port
-                bypass=""
-            )
-            
-            browser = Browser(
-                proxy=proxy,
-                disable_security=True,  # Required to ignore SSL certificate errors from mitmproxy
-                keep_alive=True,
-                user_data_dir="./projects_data/browser_data",
-            )
-            
-            await browser.start()
-            _browser_instance = browser
-            print(f"✅ Browser started with proxy on port {proxy_port}", file=sys.stderr)
-        except Exception as e:
-            print(f"❌ Error starting browser: {e}", file=sys.stderr)
-            loop.stop()
-    
-    try:
-        loop.run_until_complete(start_browser())
-        # Keep the event loop running
-        loop.run_forever()
-    except Exception as e:
-        print(f"❌ Browser thread error: {e}", file=sys.stderr)
-    finally:
-        loop.close()
+# How long start_browser waits for the browser to start
+BROWSER_START_TIMEOUT = 30  # seconds
+
+
+def get_browser_loop():
+    """Get the shared browser event loop, starting its thread on first use"""
+    global _browser_loop
+    with _browser_loop_lock:
+        if _browser_loop is None:
+            loop = uvloop.new_event_loop() if uvloop else asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name='browse-loop', daemon=True).start()
+            _browser_loop = loop
+        return _browser_loop
 
 
 async def get_or_create_browser():
     """Get existing browser instance or create a new one"""
     global _browser_instance
     
-    with _browser_lock:
+    async with _browser_lock:
         if _browser_instance is not None:
             return _browser_instance
         
@@ -69,12 +52,16 @@ async def get_or_create_browser():
             if not proxy_manager.start_proxy():
                 raise RuntimeError("Failed to start proxy")
             
-            # Wait a bit for proxy to start
-            import time
-            time.sleep(2)
+            # Wait for the proxy to listen, without blocking the event loop
+            if not await asyncio.to_thread(proxy_manager.wait_for_proxy):
+                raise RuntimeError("Proxy did not start listening")
         
         proxy_port = proxy_manager.get_proxy_port()
         
+        # Imported here so the backend starts without loading browser_use until it's needed
+        from browser_use import Browser
+        from browser_use.browser import ProxySettings
+        
         # Configure browser to use mitmproxy
         proxy = ProxySettings(
             server=f"http://127.0.0.1:{proxy_port}",
@@ -83,8 +70,9 @@ async def get_or_create_browser():
         
         browser = Browser(
             proxy=proxy,
-            disable_security=True,
+            disable_security=True,  # Required to ignore SSL certificate errors from mitmproxy
             keep_alive=True,
+            user_data_dir="./projects_data/browser_data",
         )
         
         await browser.start()
@@ -94,30 +82,16 @@ async def get_or_create_browser():
 
 
 def start_browser():
-    """Start a new browser instance with proxy settings (legacy function for UI)"""
+    """Start the shared browser with proxy settings (for the UI), reusing it if it's already running"""
     # Check if proxy is running
     if not proxy_manager.is_proxy_running():
         print("⚠️  Proxy is not running. Please start the proxy first.", file=sys.stderr)
         return False
     
-    proxy_port = proxy_manager.get_proxy_port()
-    
     try:
-        # Start browser in a separate thread
-        thread = threading.Thread(
-            target=_run_browser,
-            args=(proxy_port,),
-            daemon=True
-        )
-        thread.start()
-        
-        # Wait a bit to let browser start
-        import time
-        time.sleep(2)
-        
+        future = asyncio.run_coroutine_threadsafe(get_or_create_browser(), get_browser_loop())
+        future.result(timeout=BROWSER_START_TIMEOUT)
         return True
     except Exception as e:
         print(f"❌ Error starting browser: {e}", file=sys.stderr)
         return False
-
-
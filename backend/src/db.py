@@ -1,8 +1,12 @@
+import atexit
 import sqlite3
 from contextlib import contextmanager
 from datetime import datetime
+import functools
+import json
 import os
 import re
+import threading
 
 
 # Main database for project metadata
@@ -15,29 +19,178 @@ os.makedirs(PROJECTS_DB_DIR, exist_ok=True)
 # Main database is now also in projects_data
 MAIN_DATABASE_PATH = os.path.join(PROJECTS_DB_DIR, 'moxy.db')
 
+# Applied to every connection: with WAL (set once per database file, it persists),
+# synchronous=NORMAL only syncs at checkpoints, and temp b-trees stay in memory
+CONNECTION_PRAGMAS = (
+    'PRAGMA synchronous=NORMAL',
+    'PRAGMA temp_store=MEMORY',
+)
 
+# Projects by id (and project ids by name), so API handlers validating a project or
+# checking for a duplicate name don't query the main database every time. Only this
+# process writes projects, and every write clears the cache; the generation keeps a
+# lookup that raced with a write from caching what it read.
+_project_cache = {}
+_project_ids_by_name = {}
+_project_cache_lock = threading.Lock()
+_project_cache_generation = 0
+
+# Captured requests are read from a project database this many rows at a time
+REQUESTS_FETCH_SIZE = 500
+
+# PRAGMA user_version of a project database with the current schema; older ones are
+# migrated once by init_project_db
+PROJECT_SCHEMA_VERSION = 1
+
+# Columns of a captured request needed to list it, without the raw request/response
+REQUEST_SUMMARY_COLUMNS = ('id', 'method', 'url', 'status_code', 'duration_ms', 'timestamp', 'completed_at', 'flow_id')
+
+# proxy_state key holding a counter bumped on every proxy state write
+PROXY_STATE_VERSION_KEY = 'state_version'
+
+# Shared codecs for agent message tool_input/tool_output (stored as compact JSON)
+_encode_tool_json = json.JSONEncoder(separators=(',', ':')).encode
+_decode_tool_json = json.JSONDecoder().decode
+
+# Used by sanitize_filename to turn project names into database file names
+_FILENAME_SPECIAL_CHARS_RE = re.compile(r'[^\w\s-]')
+_FILENAME_SEPARATORS_RE = re.compile(r'[-\s]+')
+
+
+@functools.lru_cache(maxsize=256)
 def sanitize_filename(name):
     """Sanitize project name for use as filename"""
     # Replace spaces with underscores and remove special characters
-    sanitized = re.sub(r'[^\w\s-]', '', name)
-    sanitized = re.sub(r'[-\s]+', '_', sanitized)
+    sanitized = _FILENAME_SPECIAL_CHARS_RE.sub('', name)
+    sanitized = _FILENAME_SEPARATORS_RE.sub('_', sanitized)
     return sanitized.lower()
 
 
+@functools.lru_cache(maxsize=64)
 def get_project_db_path(project_name):
     """Get the database file path for a specific project using project name"""
     sanitized_name = sanitize_filename(project_name)
     return os.path.join(PROJECTS_DB_DIR, f'{sanitized_name}.db')
 
 
+# Idle connections per database, as (db_path, read_only) -> (file identity, [connections]),
+# so writes (the API, the proxy addon) and reads (API GET handlers, agent queries) don't
+# reopen the database (and re-warm its page cache) every time. With WAL, pooled read-only
+# connections never wait on the proxy's or the API's writes.
+POOL_SIZE = 4
+READ_CONN_PRAGMAS = (
+    'PRAGMA query_only=1',
+    'PRAGMA temp_store=MEMORY',
+    'PRAGMA cache_size=-64000',
+    'PRAGMA mmap_size=268435456',
+)
+_pooled_conns = {}
+_pooled_conns_lock = threading.Lock()
+
+# Files SQLite keeps next to a WAL-mode database, moved/removed along with it
+DB_SIDECAR_SUFFIXES = ('-wal', '-shm')
+
+# Project database paths known to exist, so project functions don't stat the file
+# on every call. Deleting or renaming a project's database forgets its path.
+_known_db_paths = set()
+
+
+def _forget_project_db(db_path):
+    """Drop everything cached about a project database whose file is deleted, moved or replaced"""
+    _known_db_paths.discard(db_path)
+    _requests_query_ready.discard(db_path)
+    _summary_columns_ready.discard(db_path)
+
+
+def project_db_exists(db_path):
+    """Check whether a project database file exists"""
+    if db_path in _known_db_paths:
+        return True
+    if os.path.exists(db_path):
+        _known_db_paths.add(db_path)
+        return True
+    return False
+
+
+def _acquire_conn(db_path, read_only):
+    """Take an idle connection to a database from the pool, or open a new one"""
+    # A project database that was deleted/renamed and recreated is a new file - drop the old pool
+    try:
+        st = os.stat(db_path)
+        file_id = (st.st_dev, st.st_ino)
+    except FileNotFoundError:
+        if read_only:
+            raise
+        file_id = None
+    
+    conn = None
+    stale = []
+    if file_id is not None:
+        with _pooled_conns_lock:
+            pooled_id, idle = _pooled_conns.get((db_path, read_only), (None, []))
+            if pooled_id != file_id:
+                stale = idle
+                idle = []
+                _pooled_conns[(db_path, read_only)] = (file_id, idle)
+            conn = idle.pop() if idle else None
+    for old_conn in stale:
+        old_conn.close()
+    if conn is not None:
+        return conn, file_id
+    
+    if read_only:
+        conn = sqlite3.connect(
+            f'file:{db_path}?mode=ro', uri=True, check_same_thread=False, cached_statements=256
+        )
+        pragmas = READ_CONN_PRAGMAS
+    else:
+        conn = sqlite3.connect(db_path, check_same_thread=False, cached_statements=256)
+        conn.row_factory = sqlite3.Row
+        pragmas = CONNECTION_PRAGMAS
+    for pragma in pragmas:
+        conn.execute(pragma)
+    if file_id is None:
+        # Connecting created the file
+        st = os.stat(db_path)
+        file_id = (st.st_dev, st.st_ino)
+    return conn, file_id
+
+
+def _release_conn(db_path, read_only, conn, file_id):
+    """Return a connection to its database's pool, closing it if the pool is full or stale"""
+    if conn.in_transaction:
+        conn.rollback()
+    with _pooled_conns_lock:
+        pooled_id, idle = _pooled_conns.get((db_path, read_only), (None, []))
+        if pooled_id == file_id and len(idle) < POOL_SIZE:
+            idle.append(conn)
+            return
+    conn.close()
+
+
+def close_pooled_conns(db_path=None):
+    """Close the idle pooled connections to a database (or to every database)"""
+    with _pooled_conns_lock:
+        if db_path is None:
+            pools = list(_pooled_conns.values())
+            _pooled_conns.clear()
+        else:
+            pools = [_pooled_conns.pop((db_path, read_only), (None, [])) for read_only in (True, False)]
+    for _, idle in pools:
+        for conn in idle:
+            conn.close()
+
+
+atexit.register(close_pooled_conns)
+
+
 @contextmanager
 def get_db(db_path=None):
-    """Get database connection as context manager"""
+    """Get a pooled database connection as context manager"""
     if db_path is None:
         db_path = MAIN_DATABASE_PATH
     
-    conn = sqlite3.connect(db_path)
-    conn.row_factory = sqlite3.Row
+    conn, file_id = _acquire_conn(db_path, read_only=False)
     try:
         yield conn
         conn.commit()
@@ -45,8 +198,47 @@ def get_db(db_path=None):
         conn.rollback()
         raise
     finally:
-        conn.close()
+        _release_conn(db_path, False, conn, file_id)
+
+
+def acquire_read_conn(db_path):
+    """Take an idle read-only connection to a database from the pool, or open a new one.
+    
+    Returns the connection and the identity of the file it belongs to, for release_read_conn.
+    Rows are plain tuples unless the caller sets a row_factory.
+    """
+    return _acquire_conn(db_path, read_only=True)
+
+
+def release_read_conn(db_path, conn, file_id):
+    """Return a read-only connection to its database's pool"""
+    _release_conn(db_path, True, conn, file_id)
+
+
+@contextmanager
+def get_read_db(db_path=None):
+    """Get a pooled read-only database connection as context manager"""
+    if db_path is None:
+        db_path = MAIN_DATABASE_PATH
+    
+    conn, file_id = acquire_read_conn(db_path)
+    conn.row_factory = sqlite3.Row
+    try:
+        yield conn
+    finally:
+        conn.row_factory = None
+        release_read_conn(db_path, conn, file_id)
+
+
 
+def _query_dicts(conn, query, params=()):
+    """Run a query and return its rows as dicts, built from plain tuples
+    (cheaper than dict(sqlite3.Row) for every row of a list)"""
+    cursor = conn.cursor()
+    cursor.row_factory = None
+    cursor.execute(query, params)
+    columns = [column[0] for column in cursor.description]
+    return [dict(zip(columns, row)) for row in cursor.fetchall()]
 
 def list_available_databases():
     """List all .db files in projects_data directory (excluding moxy.db)"""
@@ -98,12 +290,44 @@ def import_project_database(file_path, project_name=None):
     # Copy the file to projects_data
     import shutil
     shutil.copy2(file_path, target_path)
+    _forget_project_db(target_path)
     
     # Create new project entry in main database
     # Project-specific databases don't have a projects table, so we create the entry here
     return create_project(name=project_name, description='')
 
 
+# Main database schema, created in one transaction by init_db
+MAIN_SCHEMA_SQL = '''
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS projects (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL UNIQUE,
+    description TEXT,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+
+-- Proxy configuration
+CREATE TABLE IF NOT EXISTS proxy_state (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+
+-- Forward/drop commands sent to the proxy
+CREATE TABLE IF NOT EXISTS pending_commands (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    op TEXT NOT NULL,
+    flow_id TEXT,
+    payload TEXT
+);
+
+COMMIT;
+'''
+
+
 def init_db():
     """Initialize the database with required tables"""
     # List available databases in projects_data for reference
@@ -116,25 +340,8 @@ def init_db():
         print("   You can import these by copying them to projects_data or using the import endpoint.")
     
     with get_db() as conn:
-        cursor = conn.cursor()
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS projects (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT NOT NULL UNIQUE,
-                description TEXT,
-                created_at TEXT NOT NULL,
-                updated_at TEXT NOT NULL
-            )
-        ''')
-        
-        # Create proxy_state table for storing proxy configuration
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS proxy_state (
-                key TEXT PRIMARY KEY,
-                value TEXT NOT NULL,
-                updated_at TEXT NOT NULL
-            )
-        ''')
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.executescript(MAIN_SCHEMA_SQL)
 
 
 def ensure_default_project():
@@ -155,131 +362,264 @@ def ensure_default_project():
 
 def get_all_projects():
     """Get all projects from database"""
-    with get_db() as conn:
+    with get_read_db() as conn:
+        return _query_dicts(conn, 'SELECT * FROM projects ORDER BY created_at DESC')
+
+
+def get_projects_version():
+    """Get a value that changes whenever a project is created, updated or deleted"""
+    with get_read_db() as conn:
         cursor = conn.cursor()
-        cursor.execute('SELECT * FROM projects ORDER BY created_at DESC')
-        rows = cursor.fetchall()
-        return [dict(row) for row in rows]
+        cursor.execute('SELECT COUNT(*), MAX(id), MAX(updated_at) FROM projects')
+        return tuple(cursor.fetchone())
 
 
 def get_project_by_id(project_id):
-    """Get a project by ID"""
-    with get_db() as conn:
+    """Get a project by ID (cached)"""
+    with _project_cache_lock:
+        project = _project_cache.get(project_id)
+        generation = _project_cache_generation
+    if project is not None:
+        return dict(project)
+    
+    with get_read_db() as conn:
         cursor = conn.cursor()
         cursor.execute('SELECT * FROM projects WHERE id = ?', (project_id,))
         row = cursor.fetchone()
-        return dict(row) if row else None
+    if not row:
+        return None
+    project = dict(row)
+    with _project_cache_lock:
+        if generation == _project_cache_generation:
+            _project_cache[project_id] = project
+    return dict(project)
+
+
+def _invalidate_project_cache():
+    """Forget cached projects after a write to the projects table"""
+    global _project_cache_generation
+    with _project_cache_lock:
+        _project_cache.clear()
+        _project_ids_by_name.clear()
+        _project_cache_generation += 1
 
 
 def get_project_by_name(name):
-    """Get a project by name"""
-    with get_db() as conn:
+    """Get a project by name (cached)"""
+    with _project_cache_lock:
+        project_id = _project_ids_by_name.get(name)
+        generation = _project_cache_generation
+    if project_id is not None:
+        project = get_project_by_id(project_id)
+        if project is not None and project['name'] == name:
+            return project
+    
+    with get_read_db() as conn:
         cursor = conn.cursor()
         cursor.execute('SELECT * FROM projects WHERE name = ?', (name,))
         row = cursor.fetchone()
-        return dict(row) if row else None
+    if not row:
+        return None
+    project = dict(row)
+    with _project_cache_lock:
+        if generation == _project_cache_generation:
+            _project_ids_by_name[name] = project['id']
+    return project
+
+
+# Project database tables, created by init_project_db
+PROJECT_SCHEMA_SQL = '''
+-- HTTP requests captured by the proxy
+CREATE TABLE IF NOT EXISTS requests (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    method TEXT NOT NULL,
+    url TEXT NOT NULL,
+    raw_request TEXT,
+    raw_response TEXT,
+    status_code INTEGER,
+    duration_ms INTEGER,
+    timestamp TEXT NOT NULL,
+    completed_at TEXT,
+    flow_id TEXT
+);
+
+-- Sessions for organizing requests
+CREATE TABLE IF NOT EXISTS sessions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    description TEXT,
+    created_at TEXT NOT NULL
+);
+
+-- Resender tabs
+CREATE TABLE IF NOT EXISTS resender_tabs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    host TEXT DEFAULT 'example.com',
+    port TEXT DEFAULT '443',
+    created_at TEXT NOT NULL
+);
+
+-- Request/response pairs sent from a resender tab
+CREATE TABLE IF NOT EXISTS resender_versions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    tab_id INTEGER NOT NULL,
+    raw_request TEXT NOT NULL,
+    raw_response TEXT,
+    timestamp TEXT NOT NULL,
+    FOREIGN KEY (tab_id) REFERENCES resender_tabs(id) ON DELETE CASCADE
+);
+
+-- IDs of flows held by the proxy's interceptor
+CREATE TABLE IF NOT EXISTS intercepted_flows (
+    flow_id TEXT PRIMARY KEY,
+    timestamp TEXT NOT NULL
+);
+
+-- Agent chat conversations
+CREATE TABLE IF NOT EXISTS agent_chats (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    title TEXT,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+
+-- Agent chat messages
+CREATE TABLE IF NOT EXISTS agent_messages (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    chat_id INTEGER NOT NULL,
+    role TEXT NOT NULL,
+    content TEXT NOT NULL,
+    step_type TEXT,
+    tool_name TEXT,
+    tool_input TEXT,
+    tool_output TEXT,
+    created_at TEXT NOT NULL,
+    FOREIGN KEY (chat_id) REFERENCES agent_chats(id) ON DELETE CASCADE
+);
+'''
 
 
 def init_project_db(project_name):
     """Initialize a project-specific database with required tables"""
     db_path = get_project_db_path(project_name)
     with get_db(db_path) as conn:
+        # Readers (the agent's query pool, the UI) then never wait on the proxy's writes
+        conn.execute('PRAGMA journal_mode=WAL')
+        # Create/migrate the schema in one transaction
+        conn.executescript('BEGIN;' + PROJECT_SCHEMA_SQL)
         cursor = conn.cursor()
+        cursor.execute('PRAGMA user_version')
+        schema_version = cursor.fetchone()[0]
+        if schema_version < 1:
+            # Add the status_code and flow_id columns if they don't exist (for existing databases)
+            cursor.execute('PRAGMA table_info(requests)')
+            existing = {row['name'] for row in cursor.fetchall()}
+            for column, column_type in (('status_code', 'INTEGER'), ('flow_id', 'TEXT')):
+                if column not in existing:
+                    cursor.execute(f'ALTER TABLE requests ADD COLUMN {column} {column_type}')
+        # Always re-check the file being initialized, it may be new under a previously known path
+        _requests_query_ready.discard(db_path)
+        _summary_columns_ready.discard(db_path)
+        _ensure_requests_query_support(cursor, db_path)
+        _ensure_agent_chat_summary_columns(cursor, db_path)
+        _create_project_indexes(cursor)
         
-        # Create requests table for storing HTTP requests
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS requests (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                method TEXT NOT NULL,
-                url TEXT NOT NULL,
-                raw_request TEXT,
-                raw_response TEXT,
-                status_code INTEGER,
-                duration_ms INTEGER,
-                timestamp TEXT NOT NULL,
-                completed_at TEXT,
-                flow_id TEXT
-            )
-        ''')
-        # Add status_code column if it doesn't exist (for existing databases)
-        try:
-            cursor.execute('ALTER TABLE requests ADD COLUMN status_code INTEGER')
-        except Exception:
-            # Column already exists, ignore
-            pass
-        # Add flow_id column if it doesn't exist (for existing databases)
+        if schema_version < PROJECT_SCHEMA_VERSION:
+            cursor.execute(f'PRAGMA user_version = {PROJECT_SCHEMA_VERSION}')
+
+
+# Indexes matching the ORDER BY / WHERE of the project database's list queries,
+# so they are index scans instead of a full scan plus sort
+PROJECT_INDEXES = (
+    'CREATE INDEX IF NOT EXISTS idx_requests_timestamp ON requests(timestamp)',
+    'CREATE INDEX IF NOT EXISTS idx_resender_versions_tab_timestamp ON resender_versions(tab_id, timestamp)',
+    'CREATE INDEX IF NOT EXISTS idx_intercepted_flows_timestamp ON intercepted_flows(timestamp)',
+    'CREATE INDEX IF NOT EXISTS idx_agent_chats_updated_at ON agent_chats(updated_at)',
+    'CREATE INDEX IF NOT EXISTS idx_agent_messages_chat_created ON agent_messages(chat_id, created_at)',
+)
+
+
+def _create_project_indexes(cursor):
+    """Create the list query indexes in a project database"""
+    for statement in PROJECT_INDEXES:
+        cursor.execute(statement)
+
+
+def ensure_project_indexes():
+    """Create the list query indexes and the requests_version counter in existing project
+    databases (from before they were added)"""
+    for project in get_all_projects():
+        db_path = get_project_db_path(project['name'])
+        if not project_db_exists(db_path):
+            continue
         try:
-            cursor.execute('ALTER TABLE requests ADD COLUMN flow_id TEXT')
-        except Exception:
-            # Column already exists, ignore
-            pass
-        
-        # Create sessions table for organizing requests
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS sessions (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT NOT NULL,
-                description TEXT,
-                created_at TEXT NOT NULL
-            )
-        ''')
-        
-        # Create resender_tabs table for resender tabs
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS resender_tabs (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT NOT NULL,
-                host TEXT DEFAULT 'example.com',
-                port TEXT DEFAULT '443',
-                created_at TEXT NOT NULL
-            )
-        ''')
-        
-        # Create resender_versions table for storing request/response pairs
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS resender_versions (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                tab_id INTEGER NOT NULL,
-                raw_request TEXT NOT NULL,
-                raw_response TEXT,
-                timestamp TEXT NOT NULL,
-                FOREIGN KEY (tab_id) REFERENCES resender_tabs(id) ON DELETE CASCADE
-            )
-        ''')
-        
-        # Create intercepted_flows table for storing intercepted flow IDs
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS intercepted_flows (
-                flow_id TEXT PRIMARY KEY,
-                timestamp TEXT NOT NULL
-            )
-        ''')
-        
-        # Create agent_chats table for storing chat conversations
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS agent_chats (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                title TEXT,
-                created_at TEXT NOT NULL,
-                updated_at TEXT NOT NULL
-            )
-        ''')
-        
-        # Create agent_messages table for storing chat messages
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS agent_messages (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                chat_id INTEGER NOT NULL,
-                role TEXT NOT NULL,
-                content TEXT NOT NULL,
-                step_type TEXT,
-                tool_name TEXT,
-                tool_input TEXT,
-                tool_output TEXT,
-                created_at TEXT NOT NULL,
-                FOREIGN KEY (chat_id) REFERENCES agent_chats(id) ON DELETE CASCADE
-            )
+            with get_db(db_path) as conn:
+                cursor = conn.cursor()
+                _ensure_requests_query_support(cursor, db_path)
+                _create_project_indexes(cursor)
+        except sqlite3.Error as e:
+            # e.g. an imported database missing some of the tables
+            print(f"⚠️  Could not create indexes for project '{project['name']}': {e}")
+
+
+# Project databases known to have the requests_version counter, its triggers and the query indexes
+_requests_query_ready = set()
+
+
+def _ensure_requests_query_support(cursor, db_path):
+    """Create what the agent's query_database relies on: the requests_version counter
+    (bumped by triggers on any change to requests) and indexes for the common filters"""
+    if db_path in _requests_query_ready:
+        return
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS requests_version (
+            id INTEGER PRIMARY KEY CHECK (id = 0),
+            version INTEGER NOT NULL
+        )
+    ''')
+    cursor.execute('INSERT OR IGNORE INTO requests_version (id, version) VALUES (0, 0)')
+    for event in ('INSERT', 'UPDATE', 'DELETE'):
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS requests_version_{event.lower()}
+            AFTER {event} ON requests
+            BEGIN
+                UPDATE requests_version SET version = version + 1 WHERE id = 0;
+            END
         ''')
+    # Filter by method or status code, newest/oldest first
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_requests_method_timestamp ON requests(method, timestamp)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_requests_status_timestamp ON requests(status_code, timestamp)')
+    _requests_query_ready.add(db_path)
+
+
+def get_requests_version(conn, db_path):
+    """Get the change counter of a project's requests table, or None if it has no counter yet"""
+    cursor = conn.cursor()
+    if db_path not in _requests_query_ready:
+        # Set up by init_project_db/ensure_project_indexes, never from this (read) path
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'requests_version'")
+        if not cursor.fetchone():
+            return None
+        _requests_query_ready.add(db_path)
+    cursor.execute('SELECT version FROM requests_version WHERE id = 0')
+    return cursor.fetchone()[0]
+
+
+# Project databases whose agent_chats table is known to have the summary columns
+_summary_columns_ready = set()
+
+
+def _ensure_agent_chat_summary_columns(cursor, db_path):
+    """Add the history summary columns to agent_chats if they don't exist (for existing databases)"""
+    if db_path in _summary_columns_ready:
+        return
+    cursor.execute('PRAGMA table_info(agent_chats)')
+    existing = {row['name'] for row in cursor.fetchall()}
+    for column, column_type in (('summary', 'TEXT'), ('summary_count', 'INTEGER NOT NULL DEFAULT 0')):
+        if column not in existing:
+            cursor.execute(f'ALTER TABLE agent_chats ADD COLUMN {column} {column_type}')
+    _summary_columns_ready.add(db_path)
 
 
 def create_project(name, description=''):
@@ -288,15 +628,16 @@ def create_project(name, description=''):
     with get_db() as conn:
         cursor = conn.cursor()
         cursor.execute(
-            'INSERT INTO projects (name, description, created_at, updated_at) VALUES (?, ?, ?, ?)',
+            'INSERT INTO projects (name, description, created_at, updated_at) VALUES (?, ?, ?, ?) RETURNING *',
             (name, description, now, now)
         )
-        project_id = cursor.lastrowid
+        project = dict(cursor.fetchone())
+    _invalidate_project_cache()
     
     # Initialize the project-specific database using project name
     init_project_db(name)
     
-    return get_project_by_id(project_id)
+    return project
 
 
 def update_project(project_id, name=None, description=None):
@@ -320,7 +661,11 @@ def update_project(project_id, name=None, description=None):
             new_db_path = get_project_db_path(name)
             
             if os.path.exists(old_db_path):
-                os.rename(old_db_path, new_db_path)
+                _forget_project_db(old_db_path)
+                close_pooled_conns(old_db_path)
+                for suffix in ('',) + DB_SIDECAR_SUFFIXES:
+                    if os.path.exists(old_db_path + suffix):
+                        os.rename(old_db_path + suffix, new_db_path + suffix)
             
             updates.append('name = ?')
             params.append(name)
@@ -335,8 +680,9 @@ def update_project(project_id, name=None, description=None):
         
         query = f'UPDATE projects SET {", ".join(updates)} WHERE id = ?'
         cursor.execute(query, params)
-        
-        return get_project_by_id(project_id)
+    
+    _invalidate_project_cache()
+    return get_project_by_id(project_id)
 
 
 def delete_project(project_id):
@@ -349,13 +695,20 @@ def delete_project(project_id):
     # Delete the project-specific database file
     db_path = get_project_db_path(project['name'])
     if os.path.exists(db_path):
-        os.remove(db_path)
+        _forget_project_db(db_path)
+        close_pooled_conns(db_path)
+        for suffix in ('',) + DB_SIDECAR_SUFFIXES:
+            if os.path.exists(db_path + suffix):
+                os.remove(db_path + suffix)
     
     # Delete the project from main database
     with get_db() as conn:
         cursor = conn.cursor()
         cursor.execute('DELETE FROM projects WHERE id = ?', (project_id,))
-        return cursor.rowcount > 0
+        deleted = cursor.rowcount > 0
+    
+    _invalidate_project_cache()
+    return deleted
 
 
 # ===== Project-specific database operations =====
@@ -380,25 +733,79 @@ def add_request_to_project(project_id, method, url, headers=None, body=None,
         return cursor.lastrowid
 
 
-def get_project_requests(project_id, limit=None):
+def decode_raw_columns(row):
+    """Decode raw HTTP columns recorded as bytes by the proxy into text"""
+    for column in ('raw_request', 'raw_response'):
+        value = row.get(column)
+        if isinstance(value, bytes):
+            row[column] = value.decode('utf-8', errors='replace')
+    return row
+
+
+def get_project_requests(project_id, limit=None, since_id=None):
     """Get HTTP requests from a project's database"""
+    return list(iter_project_requests(project_id, limit, since_id))
+
+
+def get_project_requests_summary(project_id, limit=None, since_id=None):
+    """Get HTTP requests from a project's database without their raw request/response"""
+    return list(iter_project_requests(project_id, limit, since_id, columns=REQUEST_SUMMARY_COLUMNS))
+
+
+def get_project_requests_version(project_id):
+    """Get a value that changes whenever a project's captured requests change, or None if
+    there are none to track. An imported or recreated database file can restart the
+    requests_version counter, so the file's identity is part of it."""
     project = get_project_by_id(project_id)
     if not project:
-        return []
+        return None
     
     db_path = get_project_db_path(project['name'])
+    if not project_db_exists(db_path):
+        return None
     
-    if not os.path.exists(db_path):
-        return []
+    with get_read_db(db_path) as conn:
+        version = get_requests_version(conn, db_path)
+    if version is None:
+        return None
+    st = os.stat(db_path)
+    return (st.st_ino, st.st_ctime_ns, version)
+
+
+def iter_project_requests(project_id, limit=None, since_id=None, batch_size=REQUESTS_FETCH_SIZE, columns=None):
+    """Yield a project's HTTP requests newest first (only those after request since_id, if given,
+    and only the given columns, if any), fetching them batch_size rows at a time instead of
+    loading the whole table"""
+    project = get_project_by_id(project_id)
+    if not project:
+        return
     
-    with get_db(db_path) as conn:
+    db_path = get_project_db_path(project['name'])
+    
+    if not project_db_exists(db_path):
+        return
+    
+    with get_read_db(db_path) as conn:
         cursor = conn.cursor()
+        query = f'SELECT {", ".join(columns) if columns else "*"} FROM requests'
+        params = []
+        if since_id is not None:
+            query += ' WHERE id > ?'
+            params.append(since_id)
+        query += ' ORDER BY timestamp DESC'
         if limit is not None:
-            cursor.execute('SELECT * FROM requests ORDER BY timestamp DESC LIMIT ?', (limit,))
-        else:
-            cursor.execute('SELECT * FROM requests ORDER BY timestamp DESC')
-        rows = cursor.fetchall()
-        return [dict(row) for row in rows]
+            query += ' LIMIT ?'
+            params.append(limit)
+        # Plain tuples zipped with the column names are cheaper than dict(sqlite3.Row)
+        cursor.row_factory = None
+        cursor.execute(query, params)
+        columns = [column[0] for column in cursor.description]
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            for row in rows:
+                yield decode_raw_columns(dict(zip(columns, row)))
 
 
 def get_project_request(project_id, request_id):
@@ -409,14 +816,14 @@ def get_project_request(project_id, request_id):
     
     db_path = get_project_db_path(project['name'])
     
-    if not os.path.exists(db_path):
+    if not project_db_exists(db_path):
         return None
     
-    with get_db(db_path) as conn:
+    with get_read_db(db_path) as conn:
         cursor = conn.cursor()
         cursor.execute('SELECT * FROM requests WHERE id = ?', (request_id,))
         row = cursor.fetchone()
-        return dict(row) if row else None
+        return decode_raw_columns(dict(row)) if row else None
 
 
 def delete_project_request(project_id, request_id):
@@ -427,7 +834,7 @@ def delete_project_request(project_id, request_id):
     
     db_path = get_project_db_path(project['name'])
     
-    if not os.path.exists(db_path):
+    if not project_db_exists(db_path):
         return False
     
     with get_db(db_path) as conn:
@@ -444,7 +851,7 @@ def clear_project_requests(project_id):
     
     db_path = get_project_db_path(project['name'])
     
-    if not os.path.exists(db_path):
+    if not project_db_exists(db_path):
         return False
     
     with get_db(db_path) as conn:
@@ -456,7 +863,7 @@ def clear_project_requests(project_id):
 # ===== Resender operations =====
 
 def create_resender_tab(project_id, name, host='example.com', port='443'):
-    """Create a new resender tab in a project"""
+    """Create a new resender tab in a project and return it"""
     project = get_project_by_id(project_id)
     if not project:
         raise ValueError("Project not found")
@@ -469,8 +876,9 @@ def create_resender_tab(project_id, name, host='example.com', port='443'):
         cursor.execute('''
             INSERT INTO resender_tabs (name, host, port, created_at)
             VALUES (?, ?, ?, ?)
+            RETURNING *
         ''', (name, host, port, now))
-        return cursor.lastrowid
+        return dict(cursor.fetchone())
 
 
 def get_resender_tabs(project_id):
@@ -480,14 +888,11 @@ def get_resender_tabs(project_id):
         return []
     
     db_path = get_project_db_path(project['name'])
-    if not os.path.exists(db_path):
+    if not project_db_exists(db_path):
         return []
     
-    with get_db(db_path) as conn:
-        cursor = conn.cursor()
-        cursor.execute('SELECT * FROM resender_tabs ORDER BY created_at DESC')
-        rows = cursor.fetchall()
-        return [dict(row) for row in rows]
+    with get_read_db(db_path) as conn:
+        return _query_dicts(conn, 'SELECT * FROM resender_tabs ORDER BY created_at DESC')
 
 
 def get_resender_tab(project_id, tab_id):
@@ -497,24 +902,49 @@ def get_resender_tab(project_id, tab_id):
         return None
     
     db_path = get_project_db_path(project['name'])
-    if not os.path.exists(db_path):
+    if not project_db_exists(db_path):
         return None
     
-    with get_db(db_path) as conn:
+    with get_read_db(db_path) as conn:
         cursor = conn.cursor()
         cursor.execute('SELECT * FROM resender_tabs WHERE id = ?', (tab_id,))
         row = cursor.fetchone()
         return dict(row) if row else None
 
 
+def get_resender_tab_with_versions(project_id, tab_id):
+    """Get a resender tab with its versions (as tab['versions']), reading both over one connection"""
+    project = get_project_by_id(project_id)
+    if not project:
+        return None
+    
+    db_path = get_project_db_path(project['name'])
+    if not project_db_exists(db_path):
+        return None
+    
+    with get_read_db(db_path) as conn:
+        cursor = conn.cursor()
+        cursor.execute('SELECT * FROM resender_tabs WHERE id = ?', (tab_id,))
+        row = cursor.fetchone()
+        if not row:
+            return None
+        tab = dict(row)
+        tab['versions'] = _query_dicts(conn, '''
+            SELECT * FROM resender_versions 
+            WHERE tab_id = ? 
+            ORDER BY timestamp ASC
+        ''', (tab_id,))
+        return tab
+
+
 def update_resender_tab(project_id, tab_id, name=None, host=None, port=None):
-    """Update a resender tab"""
+    """Update a resender tab and return it with its versions (None if it doesn't exist)"""
     project = get_project_by_id(project_id)
     if not project:
         return None
     
     db_path = get_project_db_path(project['name'])
-    if not os.path.exists(db_path):
+    if not project_db_exists(db_path):
         return None
     
     with get_db(db_path) as conn:
@@ -532,13 +962,22 @@ def update_resender_tab(project_id, tab_id, name=None, host=None, port=None):
             updates.append('port = ?')
             params.append(port)
         
-        if not updates:
-            return get_resender_tab(project_id, tab_id)
-        
-        params.append(tab_id)
-        query = f'UPDATE resender_tabs SET {", ".join(updates)} WHERE id = ?'
-        cursor.execute(query, params)
-        return get_resender_tab(project_id, tab_id)
+        if updates:
+            params.append(tab_id)
+            query = f'UPDATE resender_tabs SET {", ".join(updates)} WHERE id = ? RETURNING *'
+            cursor.execute(query, params)
+        else:
+            cursor.execute('SELECT * FROM resender_tabs WHERE id = ?', (tab_id,))
+        row = cursor.fetchone()
+        if not row:
+            return None
+        tab = dict(row)
+        tab['versions'] = _query_dicts(conn, '''
+            SELECT * FROM resender_versions 
+            WHERE tab_id = ? 
+            ORDER BY timestamp ASC
+        ''', (tab_id,))
+        return tab
 
 
 def delete_resender_tab(project_id, tab_id):
@@ -548,7 +987,7 @@ def delete_resender_tab(project_id, tab_id):
         return False
     
     db_path = get_project_db_path(project['name'])
-    if not os.path.exists(db_path):
+    if not project_db_exists(db_path):
         return False
     
     with get_db(db_path) as conn:
@@ -558,7 +997,7 @@ def delete_resender_tab(project_id, tab_id):
 
 
 def create_resender_version(project_id, tab_id, raw_request, raw_response=None):
-    """Create a new request/response version for a tab"""
+    """Create a new request/response version for a tab and return it"""
     project = get_project_by_id(project_id)
     if not project:
         raise ValueError("Project not found")
@@ -571,8 +1010,28 @@ def create_resender_version(project_id, tab_id, raw_request, raw_response=None):
         cursor.execute('''
             INSERT INTO resender_versions (tab_id, raw_request, raw_response, timestamp)
             VALUES (?, ?, ?, ?)
+            RETURNING *
         ''', (tab_id, raw_request, raw_response, now))
-        return cursor.lastrowid
+        return dict(cursor.fetchone())
+
+
+def update_resender_version(project_id, tab_id, version_id, raw_response):
+    """Set the response of a version sent in the background"""
+    project = get_project_by_id(project_id)
+    if not project:
+        return False
+    
+    db_path = get_project_db_path(project['name'])
+    if not project_db_exists(db_path):
+        return False
+    
+    with get_db(db_path) as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            UPDATE resender_versions SET raw_response = ?
+            WHERE id = ? AND tab_id = ?
+        ''', (raw_response, version_id, tab_id))
+        return cursor.rowcount > 0
 
 
 def get_resender_versions(project_id, tab_id):
@@ -582,18 +1041,36 @@ def get_resender_versions(project_id, tab_id):
         return []
     
     db_path = get_project_db_path(project['name'])
-    if not os.path.exists(db_path):
+    if not project_db_exists(db_path):
         return []
     
-    with get_db(db_path) as conn:
-        cursor = conn.cursor()
-        cursor.execute('''
+    with get_read_db(db_path) as conn:
+        return _query_dicts(conn, '''
             SELECT * FROM resender_versions 
             WHERE tab_id = ? 
             ORDER BY timestamp ASC
         ''', (tab_id,))
-        rows = cursor.fetchall()
-        return [dict(row) for row in rows]
+
+
+def get_resender_versions_by_tab(project_id):
+    """Get the versions of every resender tab in a project in one query, as tab_id -> versions"""
+    project = get_project_by_id(project_id)
+    if not project:
+        return {}
+    
+    db_path = get_project_db_path(project['name'])
+    if not project_db_exists(db_path):
+        return {}
+    
+    with get_read_db(db_path) as conn:
+        versions = _query_dicts(conn, '''
+            SELECT * FROM resender_versions 
+            ORDER BY timestamp ASC
+        ''')
+        versions_by_tab = {}
+        for version in versions:
+            versions_by_tab.setdefault(version['tab_id'], []).append(version)
+        return versions_by_tab
 
 
 def get_resender_version(project_id, tab_id, version_id):
@@ -603,10 +1080,10 @@ def get_resender_version(project_id, tab_id, version_id):
         return None
     
     db_path = get_project_db_path(project['name'])
-    if not os.path.exists(db_path):
+    if not project_db_exists(db_path):
         return None
     
-    with get_db(db_path) as conn:
+    with get_read_db(db_path) as conn:
         cursor = conn.cursor()
         cursor.execute('''
             SELECT * FROM resender_versions 
@@ -620,7 +1097,7 @@ def get_resender_version(project_id, tab_id, version_id):
 
 def get_proxy_state(key, default=None):
     """Get a proxy state value from the main database"""
-    with get_db() as conn:
+    with get_read_db() as conn:
         cursor = conn.cursor()
         cursor.execute('SELECT value FROM proxy_state WHERE key = ?', (key,))
         row = cursor.fetchone()
@@ -633,20 +1110,59 @@ def set_proxy_state(key, value):
     with get_db() as conn:
         cursor = conn.cursor()
         cursor.execute('''
-            INSERT OR REPLACE INTO proxy_state (key, value, updated_at)
+            INSERT INTO proxy_state (key, value, updated_at)
             VALUES (?, ?, ?)
+            ON CONFLICT(key) DO UPDATE SET value = excluded.value, updated_at = excluded.updated_at
         ''', (key, value, now))
+        # Bump the version in the same transaction so cached readers notice the change
+        cursor.execute('''
+            INSERT INTO proxy_state (key, value, updated_at)
+            VALUES (?, '1', ?)
+            ON CONFLICT(key) DO UPDATE SET value = CAST(value AS INTEGER) + 1, updated_at = excluded.updated_at
+        ''', (PROXY_STATE_VERSION_KEY, now))
+
+
+def get_proxy_state_version():
+    """Get the counter that is incremented on every proxy state write"""
+    with get_read_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute('SELECT value FROM proxy_state WHERE key = ?', (PROXY_STATE_VERSION_KEY,))
+        row = cursor.fetchone()
+        return int(row['value']) if row else 0
 
 
 def get_all_proxy_state():
     """Get all proxy state as a dictionary"""
-    with get_db() as conn:
+    with get_read_db() as conn:
         cursor = conn.cursor()
         cursor.execute('SELECT key, value FROM proxy_state')
         rows = cursor.fetchall()
         return {row['key']: row['value'] for row in rows}
 
 
+def add_pending_command(op, flow_id=None, payload=None):
+    """Queue a command ('forward', 'drop' or 'forward_all') for the proxy addon"""
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            INSERT INTO pending_commands (op, flow_id, payload)
+            VALUES (?, ?, ?)
+        ''', (op, flow_id, payload))
+        return cursor.lastrowid
+
+
+def take_pending_commands():
+    """Atomically fetch and remove all queued proxy commands, oldest first"""
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute('BEGIN IMMEDIATE')
+        cursor.execute('SELECT id, op, flow_id, payload FROM pending_commands ORDER BY id')
+        rows = cursor.fetchall()
+        if rows:
+            cursor.execute('DELETE FROM pending_commands WHERE id <= ?', (rows[-1]['id'],))
+        return [(row['op'], row['flow_id'], row['payload']) for row in rows]
+
+
 # ===== Intercepted Flows Operations (Project Database) =====
 
 def get_intercepted_flows(project_name):
@@ -655,10 +1171,10 @@ def get_intercepted_flows(project_name):
         return []
     
     db_path = get_project_db_path(project_name)
-    if not os.path.exists(db_path):
+    if not project_db_exists(db_path):
         return []
     
-    with get_db(db_path) as conn:
+    with get_read_db(db_path) as conn:
         cursor = conn.cursor()
         cursor.execute('SELECT flow_id FROM intercepted_flows ORDER BY timestamp DESC')
         rows = cursor.fetchall()
@@ -671,15 +1187,16 @@ def add_intercepted_flow(project_name, flow_id):
         return False
     
     db_path = get_project_db_path(project_name)
-    if not os.path.exists(db_path):
+    if not project_db_exists(db_path):
         return False
     
     now = datetime.utcnow().isoformat()
     with get_db(db_path) as conn:
         cursor = conn.cursor()
         cursor.execute('''
-            INSERT OR REPLACE INTO intercepted_flows (flow_id, timestamp)
+            INSERT INTO intercepted_flows (flow_id, timestamp)
             VALUES (?, ?)
+            ON CONFLICT(flow_id) DO NOTHING
         ''', (flow_id, now))
         return True
 
@@ -690,7 +1207,7 @@ def remove_intercepted_flow(project_name, flow_id):
         return False
     
     db_path = get_project_db_path(project_name)
-    if not os.path.exists(db_path):
+    if not project_db_exists(db_path):
         return False
     
     with get_db(db_path) as conn:
@@ -705,7 +1222,7 @@ def clear_intercepted_flows(project_name):
         return False
     
     db_path = get_project_db_path(project_name)
-    if not os.path.exists(db_path):
+    if not project_db_exists(db_path):
         return False
     
     with get_db(db_path) as conn:
@@ -714,6 +1231,33 @@ def clear_intercepted_flows(project_name):
         return True
 
 
+def update_intercepted_flows(project_name, added, removed, replace=False):
+    """Apply a delta to the intercepted flows in one transaction (replace=True clears the table first)"""
+    if not project_name:
+        return False
+    
+    db_path = get_project_db_path(project_name)
+    if not project_db_exists(db_path):
+        return False
+    
+    now = datetime.utcnow().isoformat()
+    with get_db(db_path) as conn:
+        cursor = conn.cursor()
+        if replace:
+            cursor.execute('DELETE FROM intercepted_flows')
+        elif removed:
+            removed = list(removed)
+            placeholders = ','.join('?' * len(removed))
+            cursor.execute(f'DELETE FROM intercepted_flows WHERE flow_id IN ({placeholders})', removed)
+        if added:
+            cursor.executemany('''
+                INSERT INTO intercepted_flows (flow_id, timestamp)
+                VALUES (?, ?)
+                ON CONFLICT(flow_id) DO NOTHING
+            ''', [(flow_id, now) for flow_id in added])
+        return True
+
+
 # ===== Agent Chat Operations (Project Database) =====
 
 def create_agent_chat(project_id, title=None):
@@ -734,6 +1278,29 @@ def create_agent_chat(project_id, title=None):
         return cursor.lastrowid
 
 
+def create_chat_with_message(project_id, title, role, content):
+    """Create a new agent chat with its first message in one transaction"""
+    project = get_project_by_id(project_id)
+    if not project:
+        raise ValueError("Project not found")
+    
+    db_path = get_project_db_path(project['name'])
+    now = datetime.utcnow().isoformat()
+    
+    with get_db(db_path) as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            INSERT INTO agent_chats (title, created_at, updated_at)
+            VALUES (?, ?, ?)
+        ''', (title or "New Chat", now, now))
+        chat_id = cursor.lastrowid
+        cursor.execute('''
+            INSERT INTO agent_messages (chat_id, role, content, created_at)
+            VALUES (?, ?, ?, ?)
+        ''', (chat_id, role, content, now))
+        return chat_id
+
+
 def get_agent_chats(project_id):
     """Get all agent chats for a project"""
     project = get_project_by_id(project_id)
@@ -741,17 +1308,14 @@ def get_agent_chats(project_id):
         return []
     
     db_path = get_project_db_path(project['name'])
-    if not os.path.exists(db_path):
+    if not project_db_exists(db_path):
         return []
     
-    with get_db(db_path) as conn:
-        cursor = conn.cursor()
-        cursor.execute('''
+    with get_read_db(db_path) as conn:
+        return _query_dicts(conn, '''
             SELECT * FROM agent_chats 
             ORDER BY updated_at DESC
         ''')
-        rows = cursor.fetchall()
-        return [dict(row) for row in rows]
 
 
 def get_agent_chat(project_id, chat_id):
@@ -761,10 +1325,10 @@ def get_agent_chat(project_id, chat_id):
         return None
     
     db_path = get_project_db_path(project['name'])
-    if not os.path.exists(db_path):
+    if not project_db_exists(db_path):
         return None
     
-    with get_db(db_path) as conn:
+    with get_read_db(db_path) as conn:
         cursor = conn.cursor()
         cursor.execute('SELECT * FROM agent_chats WHERE id = ?', (chat_id,))
         row = cursor.fetchone()
@@ -778,7 +1342,7 @@ def update_agent_chat(project_id, chat_id, title=None):
         return None
     
     db_path = get_project_db_path(project['name'])
-    if not os.path.exists(db_path):
+    if not project_db_exists(db_path):
         return None
     
     now = datetime.utcnow().isoformat()
@@ -789,14 +1353,54 @@ def update_agent_chat(project_id, chat_id, title=None):
                 UPDATE agent_chats 
                 SET title = ?, updated_at = ?
                 WHERE id = ?
+                RETURNING *
             ''', (title, now, chat_id))
         else:
             cursor.execute('''
                 UPDATE agent_chats 
                 SET updated_at = ?
                 WHERE id = ?
+                RETURNING *
             ''', (now, chat_id))
-        return get_agent_chat(project_id, chat_id)
+        row = cursor.fetchone()
+        return dict(row) if row else None
+
+
+def get_agent_chat_summary(project_id, chat_id):
+    """Get the stored history summary of an agent chat and how many messages it covers"""
+    project = get_project_by_id(project_id)
+    if not project:
+        return None, 0
+    
+    db_path = get_project_db_path(project['name'])
+    if not project_db_exists(db_path):
+        return None, 0
+    
+    with get_db(db_path) as conn:
+        cursor = conn.cursor()
+        _ensure_agent_chat_summary_columns(cursor, db_path)
+        cursor.execute('SELECT summary, summary_count FROM agent_chats WHERE id = ?', (chat_id,))
+        row = cursor.fetchone()
+        if not row:
+            return None, 0
+        return row['summary'], row['summary_count']
+
+
+def set_agent_chat_summary(project_id, chat_id, summary, summary_count):
+    """Store the history summary of an agent chat covering its first summary_count messages"""
+    project = get_project_by_id(project_id)
+    if not project:
+        raise ValueError("Project not found")
+    
+    db_path = get_project_db_path(project['name'])
+    with get_db(db_path) as conn:
+        cursor = conn.cursor()
+        _ensure_agent_chat_summary_columns(cursor, db_path)
+        cursor.execute('''
+            UPDATE agent_chats 
+            SET summary = ?, summary_count = ?
+            WHERE id = ?
+        ''', (summary, summary_count, chat_id))
 
 
 def delete_agent_chat(project_id, chat_id):
@@ -806,7 +1410,7 @@ def delete_agent_chat(project_id, chat_id):
         return False
     
     db_path = get_project_db_path(project['name'])
-    if not os.path.exists(db_path):
+    if not project_db_exists(db_path):
         return False
     
     with get_db(db_path) as conn:
@@ -824,9 +1428,8 @@ def add_agent_message(project_id, chat_id, role, content, step_type=None, tool_n
     db_path = get_project_db_path(project['name'])
     now = datetime.utcnow().isoformat()
     
-    import json
-    tool_input_json = json.dumps(tool_input) if tool_input is not None else None
-    tool_output_json = json.dumps(tool_output) if tool_output is not None else None
+    tool_input_json = _encode_tool_json(tool_input) if tool_input is not None else None
+    tool_output_json = _encode_tool_json(tool_output) if tool_output is not None else None
     
     with get_db(db_path) as conn:
         cursor = conn.cursor()
@@ -846,37 +1449,69 @@ def add_agent_message(project_id, chat_id, role, content, step_type=None, tool_n
         return message_id
 
 
-def get_agent_messages(project_id, chat_id):
-    """Get all messages for an agent chat"""
+def add_agent_messages_bulk(project_id, chat_id, rows):
+    """Add several messages to an agent chat in one transaction.
+    
+    rows are (role, content, step_type, tool_name, tool_input, tool_output) tuples.
+    """
+    if not rows:
+        return
     project = get_project_by_id(project_id)
     if not project:
-        return []
+        raise ValueError("Project not found")
     
     db_path = get_project_db_path(project['name'])
-    if not os.path.exists(db_path):
-        return []
+    now = datetime.utcnow().isoformat()
+    
+    params = [
+        (
+            chat_id, role, content, step_type, tool_name,
+            _encode_tool_json(tool_input) if tool_input is not None else None,
+            _encode_tool_json(tool_output) if tool_output is not None else None,
+            now
+        )
+        for role, content, step_type, tool_name, tool_input, tool_output in rows
+    ]
     
-    import json
     with get_db(db_path) as conn:
         cursor = conn.cursor()
+        cursor.executemany('''
+            INSERT INTO agent_messages (chat_id, role, content, step_type, tool_name, tool_input, tool_output, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', params)
+        
         cursor.execute('''
+            UPDATE agent_chats 
+            SET updated_at = ?
+            WHERE id = ?
+        ''', (now, chat_id))
+
+
+def get_agent_messages(project_id, chat_id, since_id=None):
+    """Get all messages for an agent chat (only those after message since_id, if given)"""
+    project = get_project_by_id(project_id)
+    if not project:
+        return []
+    
+    db_path = get_project_db_path(project['name'])
+    if not project_db_exists(db_path):
+        return []
+    
+    with get_read_db(db_path) as conn:
+        messages = _query_dicts(conn, '''
             SELECT * FROM agent_messages 
-            WHERE chat_id = ? 
-            ORDER BY created_at ASC
-        ''', (chat_id,))
-        rows = cursor.fetchall()
-        messages = []
-        for row in rows:
-            msg = dict(row)
+            WHERE chat_id = ? AND id > ?
+            ORDER BY created_at ASC, id ASC
+        ''', (chat_id, since_id or 0))
+        for msg in messages:
             if msg['tool_input']:
                 try:
-                    msg['tool_input'] = json.loads(msg['tool_input'])
-                except:
+                    msg['tool_input'] = _decode_tool_json(msg['tool_input'])
+                except ValueError:
                     pass
             if msg['tool_output']:
                 try:
-                    msg['tool_output'] = json.loads(msg['tool_output'])
-                except:
+                    msg['tool_output'] = _decode_tool_json(msg['tool_output'])
+                except ValueError:
                     pass
-            messages.append(msg)
         return messages
@@ -1,13 +1,74 @@
 """
 HTTP request sender that parses raw HTTP requests and sends them.
 """
+import atexit
 import re
 import requests
-from urllib.parse import urlparse
+import urllib3
+from requests.adapters import HTTPAdapter
+from http.cookiejar import DefaultCookiePolicy
 import logging
 
 logger = logging.getLogger(__name__)
 
+# One shared session so repeated sends to the same host reuse kept-alive (TLS)
+# connections instead of opening a new one per request. Cookies are never stored,
+# so each raw request goes out with exactly the headers it was written with.
+# Up to HTTP_POOL_HOSTS hosts keep a pool; each pool keeps HTTP_POOL_SIZE connections,
+# enough for every resender background worker and agent tool worker at once.
+HTTP_POOL_HOSTS = 32
+HTTP_POOL_SIZE = 64
+_session = requests.Session()
+_session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+_adapter = HTTPAdapter(pool_connections=HTTP_POOL_HOSTS, pool_maxsize=HTTP_POOL_SIZE)
+_session.mount('http://', _adapter)
+_session.mount('https://', _adapter)
+atexit.register(_session.close)
+
+# Requests are sent with verify=False on purpose; don't warn about it on every send
+urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+
+# Request headers (lowercased) that requests sets itself
+_DROPPED_REQUEST_HEADERS = frozenset({'host', 'content-length'})
+
+# Response bodies are read this many bytes at a time
+RESPONSE_CHUNK_SIZE = 65536
+
+# An empty or whitespace-only line, which ends a raw request's headers
+_BLANK_LINE_RE = re.compile(r'\n[^\S\n]*(?:\n|\Z)')
+
+# Characters that end the authority (host[:port]) of an absolute-form request target
+_AUTHORITY_END_CHARS = '/?#'
+
+
+def _is_valid_method(token):
+    """Check a request line's method token (word characters only)"""
+    return token.replace('_', 'x').isalnum()
+
+
+def _is_valid_http_version(token):
+    """Check a request line's version token (HTTP/ followed by digits and dots)"""
+    version = token[5:]
+    return token.startswith('HTTP/') and bool(version) and not version.strip('0123456789.')
+
+
+def _absolute_form_path(url):
+    """Get the path and query of an absolute-form request target (https://host/path?query -> /path?query)"""
+    authority_start = url.index('//') + 2
+    end = len(url)
+    for char in _AUTHORITY_END_CHARS:
+        index = url.find(char, authority_start)
+        if index != -1 and index < end:
+            end = index
+    path = url[end:]
+    # The fragment is never sent, and an empty query is dropped
+    fragment_start = path.find('#')
+    if fragment_start != -1:
+        path = path[:fragment_start]
+    if path.endswith('?'):
+        path = path[:-1]
+    return path
+
 
 def parse_raw_http_request(raw_request: str):
     """
@@ -19,58 +80,49 @@ def parse_raw_http_request(raw_request: str):
     if not raw_request or not raw_request.strip():
         raise ValueError("Empty HTTP request")
     
-    lines = raw_request.split('\n')
-    
     # Parse request line (first line): METHOD PATH HTTP/VERSION
     # Handle both origin-form (/path) and absolute-form (https://host/path)
-    request_line = lines[0].strip()
-    request_match = re.match(r'^(\w+)\s+([^\s]+)\s+HTTP/[\d.]+$', request_line)
-    if not request_match:
+    line_end = raw_request.find('\n')
+    if line_end == -1:
+        line_end = len(raw_request)
+    request_line = raw_request[:line_end].strip()
+    parts = request_line.split()
+    if len(parts) != 3 or not _is_valid_method(parts[0]) or not _is_valid_http_version(parts[2]):
         raise ValueError(f"Invalid request line: {request_line}")
     
-    method = request_match.group(1)
-    path_or_url = request_match.group(2)
+    method, path_or_url = parts[0], parts[1]
     
     # If the path is a full URL (absolute-form), extract just the path component
     # This handles HTTP/2.0 requests which use absolute-form: GET https://host/path HTTP/2.0
     if path_or_url.startswith('http://') or path_or_url.startswith('https://'):
-        try:
-            parsed_url = urlparse(path_or_url)
-            path = parsed_url.path
-            if parsed_url.query:
-                path += '?' + parsed_url.query
-        except Exception:
-            # If URL parsing fails, try to extract path manually
-            # Format: https://host/path -> /path
-            match = re.match(r'https?://[^/]+(.*)', path_or_url)
-            path = match.group(1) if match else path_or_url
+        path = _absolute_form_path(path_or_url)
     else:
         # Origin-form: just the path
         path = path_or_url
     
+    # Headers run up to the first empty (or whitespace-only) line; the body is everything after it
+    headers_start = line_end + 1
+    blank_line = _BLANK_LINE_RE.search(raw_request, line_end) if headers_start <= len(raw_request) else None
+    if blank_line:
+        header_block = raw_request[headers_start:blank_line.start()]
+        body = raw_request[blank_line.end():]
+    else:
+        # No empty line: everything after the request line is also taken as the body
+        header_block = raw_request[headers_start:]
+        body = raw_request[headers_start:] if headers_start <= len(raw_request) else None
+    
     # Parse headers
     headers = {}
-    body_start = 1
-    for i in range(1, len(lines)):
-        line = lines[i].strip()
-        if not line:  # Empty line marks end of headers
-            body_start = i + 1
-            break
-        
+    for line in header_block.split('\n'):
         colon_idx = line.find(':')
         if colon_idx > 0:
             header_name = line[:colon_idx].strip()
-            header_value = line[colon_idx + 1:].strip()
-            headers[header_name] = header_value
+            if header_name:
+                headers[header_name] = line[colon_idx + 1:].strip()
     
-    # Parse body (everything after empty line)
-    body = None
-    if body_start < len(lines):
-        body_lines = lines[body_start:]
-        body = '\n'.join(body_lines)
-        # If body is empty string after join, set to None
-        if not body.strip():
-            body = None
+    # If body is empty or only whitespace, set to None
+    if body is not None and not body.strip():
+        body = None
     
     return {
         'method': method,
@@ -98,8 +150,15 @@ def send_raw_http_request(raw_request: str, host: str, port: str = '443', use_ht
         parsed = parse_raw_http_request(raw_request)
         method = parsed['method']
         path = parsed['path']
-        headers = parsed['headers']
         body = parsed['body']
+        # Bytes bodies go out as-is; text bodies are encoded as UTF-8
+        if body and not isinstance(body, (bytes, bytearray)):
+            body = body.encode('utf-8')
+        # Drop Host and Content-Length, in any casing (requests sets them from the URL and body)
+        headers = {
+            name: value for name, value in parsed['headers'].items()
+            if name.lower() not in _DROPPED_REQUEST_HEADERS
+        }
         
         # Build the URL
         protocol = 'https' if use_https else 'http'
@@ -110,46 +169,50 @@ def send_raw_http_request(raw_request: str, host: str, port: str = '443', use_ht
         else:
             url = f'{protocol}://{host}:{port}{path}'
         
-        # Remove Host header if present (requests library will set it)
-        headers.pop('Host', None)
-        headers.pop('host', None)
-        
-        # Remove Content-Length (requests will set it automatically)
-        headers.pop('Content-Length', None)
-        headers.pop('content-length', None)
-        
         # Send the request
-        response = requests.request(
+        response = _session.request(
             method=method,
             url=url,
             headers=headers,
-            data=body.encode('utf-8') if body else None,
+            data=body or None,
             allow_redirects=False,
             timeout=30,
-            verify=False  # Allow self-signed certs for testing
+            verify=False,  # Allow self-signed certs for testing
+            stream=True
         )
         
-        # Build raw response
-        status_line = f'HTTP/1.1 {response.status_code} {response.reason}\r\n'
-        response_headers = '\r\n'.join(f'{k}: {v}' for k, v in response.headers.items())
-        raw_response = status_line + response_headers + '\r\n\r\n'
+        # Build raw response from its parts in one join
+        parts = [f'HTTP/1.1 {response.status_code} {response.reason}\r\n']
+        response_headers = {}
+        for k, v in response.headers.items():
+            response_headers[k] = v
+            parts.append(f'{k}: {v}\r\n')
+        parts.append('\r\n')
         
-        # Add response body
+        # Add response body, read in chunks into one buffer and decoded once
+        body_bytes = bytearray()
+        try:
+            for chunk in response.iter_content(RESPONSE_CHUNK_SIZE):
+                body_bytes += chunk
+        finally:
+            response.close()
         try:
-            response_text = response.text
-            raw_response += response_text
-        except:
-            raw_response += response.content.decode('utf-8', errors='replace')
+            parts.append(body_bytes.decode(response.encoding or 'utf-8', errors='replace'))
+        except LookupError:
+            # Unknown charset in Content-Type
+            parts.append(body_bytes.decode('utf-8', errors='replace'))
+        raw_response = ''.join(parts)
         
         return {
             'status_code': response.status_code,
-            'headers': dict(response.headers),
+            'headers': response_headers,
             'raw_response': raw_response,
             'error': None
         }
         
     except requests.exceptions.RequestException as e:
-        logger.error(f"Request failed: {e}", exc_info=True)
+        # Expected for down or unreachable hosts: no traceback
+        logger.warning(f"Request failed: {e}")
         # Return error as response
         error_msg = str(e)
         raw_response = f'HTTP/1.1 000 Connection Error\r\nContent-Type: text/plain\r\n\r\n{error_msg}'
@@ -5,7 +5,9 @@ Proxy management for mitmproxy
 import subprocess
 import os
 import signal
+import socket
 import sys
+import time
 from pathlib import Path
 import json
 from . import db
@@ -14,10 +16,31 @@ from . import db
 _proxy_process = None
 _proxy_port = 8081
 
+# How long wait_for_proxy waits for a freshly started proxy to accept connections
+PROXY_READY_TIMEOUT = 10  # seconds
+PROXY_READY_POLL_INTERVAL = 0.05  # seconds
+
+# mitmdump log level (termlog_verbosity). 'warn' keeps mitmproxy_stdout.log small under heavy
+# traffic; set MOXY_LOG_LEVEL=info (or debug) to also log a line per flow when troubleshooting.
+PROXY_LOG_LEVEL = os.environ.get('MOXY_LOG_LEVEL', 'warn')
+
+
+def notify_proxy():
+    """Wake the proxy addon so it applies state changes immediately"""
+    try:
+        port = db.get_proxy_state('notify_port')
+        if not port:
+            return
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            sock.sendto(b'1', ('127.0.0.1', int(port)))
+    except (OSError, ValueError) as e:
+        print(f"Error notifying proxy: {e}", file=sys.stderr)
+
 
 def save_active_project(project_name):
     """Save the active project name to the database"""
     db.set_proxy_state('active_project', project_name if project_name else '')
+    notify_proxy()
 
 
 def get_intercept_enabled():
@@ -34,10 +57,11 @@ def set_intercept_enabled(enabled):
     try:
         db.set_proxy_state('intercept_enabled', 'true' if enabled else 'false')
         
-        # If disabling intercept, set forward_all flag to forward all queued requests
+        # If disabling intercept, forward all queued requests
         if not enabled:
-            db.set_proxy_state('forward_all', 'true')
+            db.add_pending_command('forward_all')
         
+        notify_proxy()
         return True
     except Exception as e:
         print(f"Error setting intercept state: {e}", file=sys.stderr)
@@ -62,30 +86,11 @@ def get_intercepted_flows():
 def forward_intercepted_flow(flow_id, edited_request=None):
     """Forward a specific intercepted flow"""
     try:
-        # Get current forward flows list
-        forward_flows_json = db.get_proxy_state('forward_flows', '[]')
-        try:
-            forward_flows = json.loads(forward_flows_json) if forward_flows_json else []
-        except:
-            forward_flows = []
-        
-        # Add flow to forward list
-        flow_id_str = str(flow_id)
-        if flow_id_str not in forward_flows:
-            forward_flows.append(flow_id_str)
-            db.set_proxy_state('forward_flows', json.dumps(forward_flows))
-        
-        # Store edited request if provided
+        payload = None
         if edited_request:
-            edited_requests_json = db.get_proxy_state('edited_requests', '{}')
-            try:
-                edited_requests = json.loads(edited_requests_json) if edited_requests_json else {}
-            except:
-                edited_requests = {}
-            
-            edited_requests[flow_id_str] = edited_request
-            db.set_proxy_state('edited_requests', json.dumps(edited_requests))
-        
+            payload = edited_request if isinstance(edited_request, str) else json.dumps(edited_request)
+        db.add_pending_command('forward', str(flow_id), payload)
+        notify_proxy()
         return True
     except Exception as e:
         print(f"Error forwarding intercepted flow: {e}", file=sys.stderr)
@@ -95,19 +100,8 @@ def forward_intercepted_flow(flow_id, edited_request=None):
 def drop_intercepted_flow(flow_id):
     """Drop a specific intercepted flow (kill it without forwarding)"""
     try:
-        # Get current drop flows list
-        drop_flows_json = db.get_proxy_state('drop_flows', '[]')
-        try:
-            drop_flows = json.loads(drop_flows_json) if drop_flows_json else []
-        except:
-            drop_flows = []
-        
-        # Add flow to drop list
-        flow_id_str = str(flow_id)
-        if flow_id_str not in drop_flows:
-            drop_flows.append(flow_id_str)
-            db.set_proxy_state('drop_flows', json.dumps(drop_flows))
-        
+        db.add_pending_command('drop', str(flow_id))
+        notify_proxy()
         return True
     except Exception as e:
         print(f"Error dropping intercepted flow: {e}", file=sys.stderr)
@@ -133,15 +127,17 @@ def start_proxy():
         # Open log files
         stdout_file = open(stdout_log, 'w')
         
-        # Start mitmdump process with verbose logging
+        # Start mitmdump process, logging at PROXY_LOG_LEVEL
         # Set stream_large_bodies=0 to disable streaming and capture full bodies (0 = never stream)
         # block_global=false allows connections from non-localhost IPs (needed for Docker/remote access)
+        flow_detail = 1 if PROXY_LOG_LEVEL in ('info', 'debug') else 0
         _proxy_process = subprocess.Popen(
             [
                 'mitmdump',
                 '-s', str(addon_path),
                 '-p', str(_proxy_port),
-                '--set', 'termlog_verbosity=info',  # Debug level logging
+                '--set', f'termlog_verbosity={PROXY_LOG_LEVEL}',
+                '--set', f'flow_detail={flow_detail}',  # One line per flow only when logging verbosely
                 '--set', 'block_global=false',  # Allow connections from non-localhost IPs
             ],
             stdout=stdout_file,
@@ -217,6 +213,20 @@ def get_proxy_port():
     return _proxy_port
 
 
+def wait_for_proxy(timeout=PROXY_READY_TIMEOUT):
+    """Wait until the proxy accepts connections, returning False if it exits or doesn't come up in time"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if not is_proxy_running():
+            return False
+        try:
+            socket.create_connection(('127.0.0.1', _proxy_port), timeout=PROXY_READY_POLL_INTERVAL).close()
+            return True
+        except OSError:
+            time.sleep(PROXY_READY_POLL_INTERVAL)
+    return False
+
+
 def cleanup_proxy():
     """Cleanup function to be called on application shutdown"""
     if is_proxy_running():
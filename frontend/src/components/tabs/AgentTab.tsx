@@ -166,12 +166,24 @@ export const AgentTab = () => {
     let pollInterval: NodeJS.Timeout | null = null;
     let pollTimeout: NodeJS.Timeout | null = null;
 
-    const startPolling = (chatId: number) => {
+    const startPolling = (chatId: number, untilDone = false) => {
       let lastMessageCount = messages.length + 1; // +1 for the user message we just added
+      // Fetch the full chat once, then only the messages added since the last poll
+      let chatMessages: any[] = [];
+      let lastMessageId = 0;
+      let pollInFlight = false;
       
       pollInterval = setInterval(async () => {
+        // Skip this tick if the previous poll hasn't returned yet, so increments aren't applied twice
+        if (pollInFlight) return;
+        pollInFlight = true;
         try {
-          const { chat, messages: chatMessages } = await api.getAgentChat(chatId);
+          const { messages: newMessages } = await api.getAgentChat(chatId, lastMessageId);
+          if (lastMessageId && newMessages.length === 0) return;
+          chatMessages = lastMessageId ? [...chatMessages, ...newMessages] : newMessages;
+          if (chatMessages.length > 0) {
+            lastMessageId = chatMessages[chatMessages.length - 1].id;
+          }
           
           // Always update to get latest messages
           const uiMessages: Message[] = chatMessages.map((msg: any) => ({
@@ -198,14 +210,19 @@ export const AgentTab = () => {
           if (pollInterval) clearInterval(pollInterval);
           if (pollTimeout) clearTimeout(pollTimeout);
           setIsLoading(false);
+        } finally {
+          pollInFlight = false;
         }
       }, 100); // Poll every 500ms
       
-      // Stop polling after 60 seconds max
-      pollTimeout = setTimeout(() => {
-        if (pollInterval) clearInterval(pollInterval);
-        setIsLoading(false);
-      }, 60000);
+      // Stop polling after 60 seconds max, unless the turn continues in the background
+      // (it always ends with an assistant message, even on error)
+      if (!untilDone) {
+        pollTimeout = setTimeout(() => {
+          if (pollInterval) clearInterval(pollInterval);
+          setIsLoading(false);
+        }, 60000);
+      }
     };
 
     // Start polling immediately if we have an existing chat
@@ -215,7 +232,7 @@ export const AgentTab = () => {
 
     try {
       // Send message and get chat_id (processing happens synchronously on backend)
-      const chatId = await api.chatWithAgent(messageText, currentChatId || undefined);
+      const { chatId, pending } = await api.chatWithAgent(messageText, currentChatId || undefined);
       
       // Update current chat ID if a new chat was created
       if (chatId && chatId !== currentChatId) {
@@ -224,13 +241,18 @@ export const AgentTab = () => {
         // Start polling for new chat
         if (pollInterval) clearInterval(pollInterval);
         if (pollTimeout) clearTimeout(pollTimeout);
-        startPolling(chatId);
+        startPolling(chatId, pending);
       } else if (!currentChatId) {
         // New chat created, start polling now
         setCurrentChatId(chatId);
         if (pollInterval) clearInterval(pollInterval);
         if (pollTimeout) clearTimeout(pollTimeout);
-        startPolling(chatId);
+        startPolling(chatId, pending);
+      } else if (pending) {
+        // Keep polling past the 60 second limit until the background turn finishes
+        if (pollInterval) clearInterval(pollInterval);
+        if (pollTimeout) clearTimeout(pollTimeout);
+        startPolling(chatId, true);
       }
       
       // Also fetch immediately in case processing is already done
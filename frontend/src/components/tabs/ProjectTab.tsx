@@ -85,7 +85,7 @@ export const ProjectTab = () => {
 
   const loadProjectRequests = async (projectId: number) => {
     try {
-      const data = await api.getProjectRequests(projectId);
+      const data = await api.getProjectRequestsSummary(projectId);
       setRequests(data);
     } catch (error) {
       toast({
@@ -173,11 +173,24 @@ class ApiClient {
   }
 
   // Request endpoints (per project)
-  async getProjectRequests(projectId: number, limit?: number): Promise<HttpRequest[]> {
-    const params = limit ? `?limit=${limit}` : '';
+  async getProjectRequests(projectId: number, limit?: number, sinceId?: number): Promise<HttpRequest[]> {
+    const params = this.requestListParams(limit, sinceId);
     return this.request<HttpRequest[]>(`/api/projects/${projectId}/requests${params}`);
   }
 
+  // Same list without raw_request/raw_response, for views that don't show them
+  async getProjectRequestsSummary(projectId: number, limit?: number, sinceId?: number): Promise<HttpRequest[]> {
+    const params = this.requestListParams(limit, sinceId);
+    return this.request<HttpRequest[]>(`/api/projects/${projectId}/requests/summary${params}`);
+  }
+
+  private requestListParams(limit?: number, sinceId?: number): string {
+    const query = new URLSearchParams();
+    if (limit) query.set('limit', String(limit));
+    if (sinceId) query.set('since', String(sinceId));
+    return query.toString() ? `?${query}` : '';
+  }
+
   async getProjectRequest(projectId: number, requestId: number): Promise<HttpRequest> {
     return this.request<HttpRequest>(`/api/projects/${projectId}/requests/${requestId}`);
   }
@@ -351,8 +364,9 @@ class ApiClient {
     });
   }
 
-  async getAgentChat(chatId: number): Promise<{ chat: any; messages: any[] }> {
-    return this.request<{ chat: any; messages: any[] }>(`/api/agent/chats/${chatId}`, {
+  async getAgentChat(chatId: number, sinceId?: number): Promise<{ chat: any; messages: any[] }> {
+    const query = sinceId ? `?since=${sinceId}` : '';
+    return this.request<{ chat: any; messages: any[] }>(`/api/agent/chats/${chatId}${query}`, {
       method: 'GET',
     });
   }
@@ -366,7 +380,7 @@ class ApiClient {
   async chatWithAgent(
     message: string,
     chatId?: number
-  ): Promise<number> {
+  ): Promise<{ chatId: number; pending: boolean }> {
     const url = `${this.baseUrl}/api/agent/chat`;
     const response = await fetch(url, {
       method: 'POST',
@@ -382,7 +396,8 @@ class ApiClient {
     }
 
     const data = await response.json();
-    return data.chat_id || 0;
+    // pending: the turn is still running in the background (e.g. browsing)
+    return { chatId: data.chat_id || 0, pending: !!data.pending };
   }
 
   async resenderAgent(text: string): Promise<string> {